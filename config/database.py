@@ -1,6 +1,516 @@
 import sqlite3
 import os
+import base64
+import json
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+# 连接创建时应用的PRAGMA配置，按 DB_PRAGMA_PROFILE 选择；busy_timeout 放在最前，切换日志模式时可等待锁
+PRAGMA_PROFILES = {
+    # WAL模式下读写互不阻塞，NORMAL同步在WAL下仍保证数据库一致性
+    'wal': [
+        ('busy_timeout', 5000),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', -65536),  # 负数表示KiB，即64MB页缓存
+        ('mmap_size', 268435456),  # 256MB内存映射I/O
+        ('temp_store', 'MEMORY'),
+    ],
+    # 回滚日志 + FULL同步，适合不支持共享内存的网络文件系统
+    'safe': [
+        ('busy_timeout', 5000),
+        ('journal_mode', 'DELETE'),
+        ('synchronous', 'FULL'),
+    ],
+    # 不修改任何设置，保持SQLite默认行为
+    'none': [],
+}
+
+
+def apply_pragma_profile(conn: sqlite3.Connection, profile: str = None):
+    """连接初始化钩子：为新连接应用PRAGMA配置"""
+    profile = profile or os.getenv('DB_PRAGMA_PROFILE', 'wal')
+    if profile not in PRAGMA_PROFILES:
+        print(f"未知的PRAGMA配置 {profile}，使用默认配置 wal")
+        profile = 'wal'
+    for name, value in PRAGMA_PROFILES[profile]:
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+# 命名查询: 名称 -> SQL；同一条SQL文本在每个连接的语句缓存中只解析一次
+_named_queries = {}
+_query_names = {}
+
+
+def register_query(name: str, sql: str) -> str:
+    """注册命名查询并返回其SQL，统计信息按名称汇总"""
+    registered = _named_queries.get(name)
+    if registered is not None and registered != sql:
+        raise ValueError(f"命名查询 {name} 已注册为不同的SQL")
+    _named_queries[name] = sql
+    _query_names[sql] = name
+    return sql
+
+
+def named_query(name: str) -> str:
+    """按名称取出已注册的SQL"""
+    return _named_queries[name]
+
+
+class QueryStats:
+    """按语句统计执行次数、返回行数和耗时分布（保留最近 sample_size 次耗时计算分位数）"""
+
+    def __init__(self, sample_size: int = 1024):
+        self.enabled = os.getenv('DB_QUERY_STATS', '1') != '0'
+        self.sample_size = sample_size
+        self._stats = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _key(self, sql: str) -> str:
+        key = self._keys.get(sql)
+        if key is None:
+            # 命名查询按名称汇总，内联SQL按压缩空白后的文本汇总
+            key = _query_names.get(sql) or ' '.join(sql.split())
+            if len(self._keys) < 4096:
+                self._keys[sql] = key
+        return key
+
+    def record(self, sql: str, seconds: float, rows: int = None):
+        key = self._key(sql)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = {'count': 0, 'rows': 0, 'total': 0.0,
+                                           'samples': deque(maxlen=self.sample_size)}
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['samples'].append(seconds)
+            if rows is not None:
+                stat['rows'] += rows
+
+    def snapshot(self) -> List[Dict]:
+        """按累计耗时从高到低返回各语句的统计"""
+        with self._lock:
+            items = [(key, dict(stat), sorted(stat['samples'])) for key, stat in self._stats.items()]
+
+        result = []
+        for key, stat, samples in items:
+            result.append({
+                'query': key,
+                'count': stat['count'],
+                'rows': stat['rows'],
+                'total_ms': round(stat['total'] * 1000, 3),
+                'p50_ms': round(samples[int(0.50 * (len(samples) - 1))] * 1000, 3),
+                'p99_ms': round(samples[int(0.99 * (len(samples) - 1))] * 1000, 3)
+            })
+        result.sort(key=lambda item: item['total_ms'], reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
+
+# 热点命名查询：LSH验证时读取俱乐部最近的已完成转会（覆盖索引 idx_transfers_*_history）
+for _role, _column in (('selling', 'selling_club_id'), ('buying', 'buying_club_id')):
+    register_query(f'club_history_{_role}', f"""
+        SELECT transfer_fee, agent_commission, total_expense
+        FROM transfers
+        WHERE {_column} = ? AND is_completed = 1
+        ORDER BY created_at DESC LIMIT ?
+    """)
+    # 俱乐部已完成转会的水位（数量、最大rowid），用于判断内存中的增量投影状态是否过期
+    register_query(f'club_history_watermark_{_role}', f"""
+        SELECT COUNT(*), COALESCE(MAX(rowid), 0)
+        FROM transfers
+        WHERE {_column} = ? AND is_completed = 1
+    """)
+
+# 全部转会记录导出，按完成时间倒序流式读取（索引 idx_transfers_completed_at_id）
+register_query('transfer_history_export', """
+    SELECT t.*, p.name as player_name, p.position,
+           sc.name as selling_club_name, bc.name as buying_club_name,
+           lv.similarity_score, lv.is_legitimate
+    FROM transfers t
+    JOIN players p ON t.player_id = p.player_id
+    JOIN clubs sc ON t.selling_club_id = sc.club_id
+    JOIN clubs bc ON t.buying_club_id = bc.club_id
+    LEFT JOIN lsh_validations lv ON t.transfer_id = lv.transfer_id
+    ORDER BY t.completed_at DESC, t.transfer_id DESC
+""")
+
+
+class TrackedCursor(sqlite3.Cursor):
+    """计入 query_stats 的游标
+
+    耗时只累计在 execute 和各次 fetch 调用内部（不含调用方处理结果的时间），行数为实际取出的行数；
+    查询在结果取完、游标关闭、重新执行或被回收时记录一次，写语句执行后立即按影响行数记录。
+    """
+
+    _stats_sql = None
+
+    def _start(self, sql):
+        self._finish()
+        self._stats_sql = sql
+        self._stats_seconds = 0.0
+        self._stats_rows = 0
+
+    def _finish(self, rows: int = None):
+        if self._stats_sql is None:
+            return
+        sql, self._stats_sql = self._stats_sql, None
+        query_stats.record(sql, self._stats_seconds, self._stats_rows if rows is None else rows)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._stats_seconds += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish(max(self.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish(max(self.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._stats_rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._stats_rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._stats_rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._stats_rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass  # 解释器退出时模块全局变量可能已被清理
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接，close() 时归还连接池而不是真正关闭；通过游标执行的语句计入 query_stats
+
+    track_stats 为 False 时不统计，连接池自身的 PRAGMA 和健康检查语句不计入。
+    """
+
+    pool = None
+    checked_out = False
+    track_stats = True
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = TrackedCursor if query_stats.enabled and self.track_stats else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    @contextmanager
+    def untracked(self):
+        """块内执行的语句不计入 query_stats"""
+        previous, self.track_stats = self.track_stats, False
+        try:
+            yield self
+        finally:
+            self.track_stats = previous
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def dispose(self):
+        """真正关闭底层连接"""
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """线程安全的SQLite连接池
+
+    空闲连接按后进先出复用（最近归还的连接缓存最热），取出前做健康检查，最多保留 size 个空闲连接。
+    未归还的连接被回收时由SQLite回滚，与直接创建连接时的行为一致。
+    """
+
+    def __init__(self, db_path: str, size: int = None, on_connect=apply_pragma_profile):
+        self.db_path = db_path
+        self.size = int(size or os.getenv('DB_POOL_SIZE', 8))
+        # 每个连接缓存的预编译语句数（LRU），命名查询和常用内联SQL不必重复解析
+        self.statement_cache_size = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+        # 连接初始化钩子，每个新连接只调用一次
+        self.on_connect = on_connect
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _create(self) -> PooledConnection:
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False,
+                               cached_statements=self.statement_cache_size)
+        conn.row_factory = sqlite3.Row  # 使结果可以像字典一样访问
+        if self.on_connect is not None:
+            with conn.untracked():
+                self.on_connect(conn)
+        conn.pool = self
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            with conn.untracked():
+                conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """取出一个可用连接"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._create()
+                break
+            if self._is_healthy(conn):
+                break
+            conn.dispose()
+
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """归还连接；未提交的事务会被回滚，与直接关闭连接的行为一致"""
+        if not conn.checked_out:
+            return
+        conn.checked_out = False
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            conn.dispose()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.dispose()
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.dispose()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """按数据库文件获取共享的连接池"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+# 列表接口的默认与最大分页大小
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: List) -> str:
+    """把上一页最后一行的排序键编码为不透明的游标"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> List:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if not isinstance(values, list):
+        raise ValueError('无效的分页游标')
+    return values
+
+
+def keyset_page_sql(select_sql: str, conditions: List[str], sort_keys: List[Tuple[str, str]],
+                    with_cursor: bool = False) -> str:
+    """生成键集分页的SQL；with_cursor 为真时附加游标条件，参数依次为 conditions 的参数、游标值、LIMIT"""
+    conditions = list(conditions)
+    if with_cursor:
+        columns = ', '.join(expression for expression, _ in sort_keys)
+        placeholders = ', '.join('?' for _ in sort_keys)
+        conditions.append(f"({columns}) < ({placeholders})")
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = ', '.join(f"{expression} DESC" for expression, _ in sort_keys)
+    return f"{select_sql}{where} ORDER BY {order} LIMIT ?"
+
+
+def fetch_keyset_page(conn, select_sql: str, conditions: List[str], params: List,
+                      sort_keys: List[Tuple[str, str]], limit: int = None,
+                      cursor: str = None) -> Tuple[List, str]:
+    """键集分页查询
+
+    sort_keys 为 [(排序表达式, 结果列名)]，全部按降序排列，最后一个应是唯一列以保证顺序稳定。
+    排序键不能为 NULL（NULL 与游标比较结果为 NULL，这些行会从后续页中消失），可空列需在 conditions 中过滤。
+    返回 (本页行字典列表, 下一页游标)，没有下一页时游标为 None。
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    params = list(params)
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(sort_keys):
+            raise ValueError('无效的分页游标')
+        params.extend(values)
+
+    sql = keyset_page_sql(select_sql, conditions, sort_keys, bool(cursor))
+    rows = list(iter_rows(conn, sql, params + [limit + 1]))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][name] for _, name in sort_keys])
+    return rows, next_cursor
+
+
+# 列表接口的分页查询: 名称 -> (SELECT部分, 过滤条件, 排序键)；迁移的执行计划检查使用同一份定义
+PAGE_QUERIES = {
+    'transferable_players': ("""
+        SELECT p.*, c.name as club_name
+        FROM players p
+        JOIN clubs c ON p.current_club_id = c.club_id
+    """, ['p.transfer_status = 1', 'p.market_value IS NOT NULL'],
+        [('p.market_value', 'market_value'), ('p.player_id', 'player_id')]),
+    'pending_offers': ("""
+        SELECT o.*, p.name as player_name, p.position, p.market_value,
+               oc.name as offering_club_name, rc.name as receiving_club_name
+        FROM transfer_offers o
+        JOIN players p ON o.player_id = p.player_id
+        JOIN clubs oc ON o.offering_club_id = oc.club_id
+        JOIN clubs rc ON o.receiving_club_id = rc.club_id
+    """, ["o.offer_status = 'pending'", 'o.offer_date IS NOT NULL'],
+        [('o.offer_date', 'offer_date'), ('o.offer_id', 'offer_id')]),
+    'transfer_history': ("""
+        SELECT t.*, p.name as player_name, p.position,
+               sc.name as selling_club_name, bc.name as buying_club_name,
+               lv.similarity_score, lv.is_legitimate
+        FROM transfers t
+        JOIN players p ON t.player_id = p.player_id
+        JOIN clubs sc ON t.selling_club_id = sc.club_id
+        JOIN clubs bc ON t.buying_club_id = bc.club_id
+        LEFT JOIN lsh_validations lv ON t.transfer_id = lv.transfer_id
+    """, ['t.is_completed = 1', 't.completed_at IS NOT NULL'],
+        [('t.completed_at', 'completed_at'), ('t.transfer_id', 'transfer_id')]),
+    'unread_notifications': ("""
+        SELECT n.*, c.name as club_name
+        FROM notifications n
+        JOIN clubs c ON n.club_id = c.club_id
+    """, ['n.is_read = 0', 'n.created_at IS NOT NULL'],
+        [('n.created_at', 'created_at'), ('n.notification_id', 'notification_id')]),
+}
+
+
+def fetch_named_page(conn, name: str, limit: int = None, cursor: str = None) -> Tuple[List, str]:
+    """按 PAGE_QUERIES 中的定义做键集分页查询"""
+    select_sql, conditions, sort_keys = PAGE_QUERIES[name]
+    return fetch_keyset_page(conn, select_sql, conditions, [], sort_keys, limit, cursor)
+
+
+# 流式读取时每次 fetchmany 的行数
+STREAM_CHUNK_SIZE = int(os.getenv('DB_STREAM_CHUNK_SIZE', 500))
+
+
+def iter_rows(conn, sql: str, params=(), chunk_size: int = None):
+    """按 fetchmany 分块逐行产出字典，内存中只保留当前一块结果"""
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size or STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        cursor.close()
+
+
+def _json_default(value):
+    """JSON无法直接编码的值：BLOB转为十六进制，其余转为字符串"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def iter_json_array(rows, batch_size: int = None):
+    """把行迭代器编码为JSON数组，按批产出UTF-8字节块，可直接写入响应流"""
+    encoder = json.JSONEncoder(default=_json_default)
+    batch_size = batch_size or STREAM_CHUNK_SIZE
+    separator = '['
+    batch = []
+    for row in rows:
+        batch.append(encoder.encode(dict(row)))
+        if len(batch) >= batch_size:
+            yield (separator + ','.join(batch)).encode('utf-8')
+            separator = ','
+            batch = []
+    if batch:
+        yield (separator + ','.join(batch)).encode('utf-8')
+        separator = ','
+    yield (']' if separator == ',' else '[]').encode('utf-8')
 
 
 class DatabaseConfig:
@@ -10,9 +520,7 @@ class DatabaseConfig:
     def get_connection():
         """获取数据库连接"""
         try:
-            conn = sqlite3.connect(DatabaseConfig.DB_PATH)
-            conn.row_factory = sqlite3.Row  # 使结果可以像字典一样访问
-            return conn
+            return get_pool(DatabaseConfig.DB_PATH).acquire()
         except sqlite3.Error as e:
             print(f"数据库连接错误: {e}")
             return None
@@ -40,13 +548,13 @@ class DatabaseConfig:
     def execute_query(query, params=None):
         """执行查询并返回结果"""
         try:
+            # 连接池游标（TrackedCursor）自行计入 query_stats
             with DatabaseConfig.get_db_cursor() as (cursor, conn):
                 cursor.execute(query, params or ())
 
-                if query.strip().upper().startswith('SELECT'):
-                    # 对于查询操作，返回结果
-                    rows = cursor.fetchall()
-                    return [dict(row) for row in rows]  # 转换为字典列表
+                # 有结果列的语句（SELECT、PRAGMA、RETURNING 等）返回结果
+                if cursor.description is not None:
+                    return [dict(row) for row in cursor.fetchall()]  # 转换为字典列表
                 else:
                     # 对于插入/更新/删除操作，返回影响的行数
                     return cursor.rowcount
@@ -54,6 +562,27 @@ class DatabaseConfig:
             print(f"查询执行错误: {e}")
             return None
 
+    @staticmethod
+    def iter_query(query, params=None, chunk_size=None):
+        """流式执行查询，逐行产出字典；迭代结束或中途关闭时归还连接"""
+        conn = DatabaseConfig.get_connection()
+        if not conn:
+            raise Exception("无法连接到数据库")
+        try:
+            yield from iter_rows(conn, query, params or (), chunk_size)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def execute_named(name, params=None):
+        """按名称执行已注册的查询"""
+        return DatabaseConfig.execute_query(named_query(name), params)
+
+    @staticmethod
+    def query_stats():
+        """各语句的执行统计，按累计耗时排序"""
+        return query_stats.snapshot()
+
     @staticmethod
     def execute_many(query, params_list):
         """批量执行操作"""
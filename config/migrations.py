@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sqlite3
+from contextlib import contextmanager
+from typing import List
+
+from config.database import DatabaseConfig, apply_pragma_profile, PAGE_QUERIES, keyset_page_sql, named_query
+
+# 回填时每批更新的行数，每批单独提交，避免长时间持有写锁
+BACKFILL_BATCH_SIZE = 5000
+
+
+@contextmanager
+def _transaction(conn):
+    """短事务：BEGIN IMMEDIATE 立即获取写锁，出错时回滚"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _add_column(conn, table: str, column: str, definition: str):
+    """列不存在时才添加；SQLite 的 ADD COLUMN 只修改表定义，不重写数据"""
+    with _transaction(conn):
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            print(f"已添加列 {table}.{column}")
+
+
+def _backfill(conn, table: str, assignment: str, condition: str, batch_size: int = None):
+    """按 rowid 区间分批回填，中断后重新运行会从未回填的行继续"""
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    updated = 0
+    for start in range(0, max_rowid, batch_size):
+        with _transaction(conn):
+            cursor = conn.execute(f"""
+                UPDATE {table} SET {assignment}
+                WHERE rowid > ? AND rowid <= ? AND {condition}
+            """, (start, start + batch_size))
+            updated += cursor.rowcount
+    print(f"回填 {table}: {updated} 条")
+
+
+# 版本1: 项目最初的表结构
+BASE_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS clubs (
+        club_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        country TEXT,
+        league TEXT,
+        city TEXT,
+        founded_year INTEGER,
+        stadium TEXT,
+        wallet_address TEXT UNIQUE,
+        private_key TEXT,
+        balance DECIMAL(15,2) DEFAULT 0,
+        transfer_budget DECIMAL(15,2) DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS coaches (
+        coach_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        nationality TEXT,
+        birth_place TEXT,
+        birth_date DATE,
+        current_club_id TEXT,
+        coaching_style TEXT,
+        major_achievements TEXT,
+        contract_start DATE,
+        contract_end DATE,
+        salary DECIMAL(12,2),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (current_club_id) REFERENCES clubs(club_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS players (
+        player_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        english_name TEXT,
+        position TEXT,
+        nationality TEXT,
+        birth_place TEXT,
+        birth_date DATE,
+        height DECIMAL(3,2),
+        weight DECIMAL(5,2),
+        preferred_foot TEXT,
+        current_club_id TEXT,
+        market_value DECIMAL(12,2),
+        transfer_status BOOLEAN DEFAULT 0,
+        jersey_number INTEGER,
+        contract_start DATE,
+        contract_end DATE,
+        salary DECIMAL(12,2),
+        major_achievements TEXT,
+        club_career_history TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (current_club_id) REFERENCES clubs(club_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS transfer_offers (
+        offer_id TEXT PRIMARY KEY,
+        player_id TEXT,
+        offering_club_id TEXT,
+        receiving_club_id TEXT,
+        offer_amount DECIMAL(12,2),
+        additional_terms TEXT,
+        offer_status TEXT DEFAULT 'pending',  -- pending, accepted, rejected, expired
+        offer_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expiry_date TIMESTAMP,
+        response_date TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (player_id) REFERENCES players(player_id),
+        FOREIGN KEY (offering_club_id) REFERENCES clubs(club_id),
+        FOREIGN KEY (receiving_club_id) REFERENCES clubs(club_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS transfers (
+        transfer_id TEXT PRIMARY KEY,
+        player_id TEXT,
+        selling_club_id TEXT,
+        buying_club_id TEXT,
+        transfer_fee DECIMAL(12,2),
+        additional_costs DECIMAL(12,2) DEFAULT 0,
+        income_data TEXT,  -- JSON格式存储收入数据
+        expense_data TEXT,  -- JSON格式存储支出数据
+        transaction_hash TEXT,
+        lsh_income_hash TEXT,
+        lsh_expense_hash TEXT,
+        is_validated BOOLEAN DEFAULT 0,
+        is_completed BOOLEAN DEFAULT 0,
+        transfer_window TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        FOREIGN KEY (player_id) REFERENCES players(player_id),
+        FOREIGN KEY (selling_club_id) REFERENCES clubs(club_id),
+        FOREIGN KEY (buying_club_id) REFERENCES clubs(club_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS notifications (
+        notification_id TEXT PRIMARY KEY,
+        club_id TEXT,
+        message_type TEXT,  -- offer_received, offer_accepted, offer_rejected, transfer_completed
+        title TEXT,
+        message TEXT,
+        related_offer_id TEXT,
+        related_transfer_id TEXT,
+        is_read BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (club_id) REFERENCES clubs(club_id),
+        FOREIGN KEY (related_offer_id) REFERENCES transfer_offers(offer_id),
+        FOREIGN KEY (related_transfer_id) REFERENCES transfers(transfer_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lsh_validations (
+        validation_id TEXT PRIMARY KEY,
+        transfer_id TEXT,
+        income_index TEXT,
+        expense_index TEXT,
+        similarity_score DECIMAL(5,4),
+        is_legitimate BOOLEAN,
+        validation_details TEXT,
+        risk_level TEXT,  -- low, medium, high
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (transfer_id) REFERENCES transfers(transfer_id)
+    )
+    ''',
+]
+
+
+def _create_base_tables(conn):
+    with _transaction(conn):
+        for statement in BASE_TABLES:
+            conn.execute(statement)
+
+
+def _add_signature_and_amount_columns(conn):
+    """版本2: 打包签名列，以及从JSON字段拆出的佣金/总支出列"""
+    _add_column(conn, 'transfers', 'lsh_income_signature', 'BLOB')
+    _add_column(conn, 'transfers', 'lsh_expense_signature', 'BLOB')
+    _add_column(conn, 'transfers', 'agent_commission', 'DECIMAL(12,2)')
+    _add_column(conn, 'transfers', 'total_expense', 'DECIMAL(12,2)')
+    _add_column(conn, 'lsh_validations', 'income_signature', 'BLOB')
+    _add_column(conn, 'lsh_validations', 'expense_signature', 'BLOB')
+
+    # 从JSON字段回填佣金与总支出，历史加载时不必再解析JSON
+    _backfill(conn, 'transfers', "agent_commission = json_extract(income_data, '$.agent_commission')",
+              "agent_commission IS NULL AND json_valid(income_data) "
+              "AND json_extract(income_data, '$.agent_commission') IS NOT NULL")
+    _backfill(conn, 'transfers', "total_expense = json_extract(expense_data, '$.total_expense')",
+              "total_expense IS NULL AND json_valid(expense_data) "
+              "AND json_extract(expense_data, '$.total_expense') IS NOT NULL")
+
+
+# 热点查询使用的二级索引: (索引名, 表及列)
+# 分页列表的索引以唯一的次排序列结尾，ORDER BY 与游标条件都能直接在索引上完成
+HOT_QUERY_INDEXES = [
+    ('idx_players_club_jersey', 'players(current_club_id, jersey_number)'),
+    ('idx_players_status_value_id', 'players(transfer_status, market_value DESC, player_id DESC)'),
+    ('idx_offers_status_date_id', 'transfer_offers(offer_status, offer_date DESC, offer_id DESC)'),
+    ('idx_notifications_club_read', 'notifications(club_id, is_read, created_at DESC)'),
+    ('idx_notifications_unread_id', 'notifications(is_read, created_at DESC, notification_id DESC)'),
+    # 覆盖索引：LSH历史加载只需读取索引，不必回表
+    ('idx_transfers_seller_history',
+     'transfers(selling_club_id, is_completed, created_at, transfer_fee, agent_commission, total_expense)'),
+    ('idx_transfers_buyer_history',
+     'transfers(buying_club_id, is_completed, created_at, transfer_fee, agent_commission, total_expense)'),
+    ('idx_transfers_completed_created', 'transfers(is_completed, created_at)'),
+    ('idx_transfers_completed_history', 'transfers(is_completed, completed_at DESC, transfer_id DESC)'),
+    ('idx_transfers_completed_at_id', 'transfers(completed_at DESC, transfer_id DESC)'),
+    ('idx_lsh_validations_transfer', 'lsh_validations(transfer_id)'),
+]
+
+# 被上面带次排序列的索引取代的旧索引
+SUPERSEDED_INDEXES = [
+    'idx_players_status_value',
+    'idx_offers_status_date',
+    'idx_notifications_unread',
+    'idx_transfers_completed_at',
+]
+
+
+def _create_hot_query_indexes(conn):
+    """版本3: 热点查询的二级索引，每个索引单独建立"""
+    for name, target in HOT_QUERY_INDEXES:
+        with _transaction(conn):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        print(f"已创建索引 {name}")
+
+
+def _add_keyset_tiebreak_indexes(conn):
+    """版本6: 分页索引加上次排序列，先建新索引再删除被取代的旧索引"""
+    _create_hot_query_indexes(conn)
+    for name in SUPERSEDED_INDEXES:
+        with _transaction(conn):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        print(f"已删除索引 {name}")
+
+
+def _add_indexer_heartbeat_columns(conn):
+    """版本7: 同步检查点记录索引线程最近一次看到的链头区块与心跳时间（Unix秒），读取方据此判断镜像是否可用"""
+    _add_column(conn, 'chain_checkpoints', 'chain_head', 'INTEGER')
+    _add_column(conn, 'chain_checkpoints', 'heartbeat_at', 'REAL')
+
+
+# 链上数据的本地镜像，由 services/chain_indexer.py 根据合约事件维护；按合约地址区分，重新部署后互不影响
+CHAIN_MIRROR_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS chain_transfers (
+        contract_address TEXT NOT NULL,
+        transfer_id INTEGER NOT NULL,
+        selling_club TEXT,
+        buying_club TEXT,
+        player_id TEXT,  -- uint256 以十进制字符串保存
+        transfer_fee TEXT,
+        status_code INTEGER,
+        proposal_timestamp INTEGER,
+        acceptance_timestamp INTEGER,
+        validation_timestamp INTEGER,
+        is_legitimate BOOLEAN,
+        lsh_income_hash TEXT,
+        lsh_expense_hash TEXT,
+        updated_block INTEGER,
+        PRIMARY KEY (contract_address, transfer_id)
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_chain_transfers_status
+    ON chain_transfers(contract_address, status_code)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chain_clubs (
+        contract_address TEXT NOT NULL,
+        address TEXT NOT NULL,
+        name TEXT,
+        country TEXT,
+        registered_block INTEGER,
+        PRIMARY KEY (contract_address, address)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chain_checkpoints (
+        contract_address TEXT PRIMARY KEY,
+        last_block INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+
+def _create_chain_mirror_tables(conn):
+    """版本4: 链上转会与俱乐部的本地镜像及同步检查点"""
+    with _transaction(conn):
+        for statement in CHAIN_MIRROR_TABLES:
+            conn.execute(statement)
+
+
+def _add_chain_status_columns(conn):
+    """版本5: 转会的链上三步流程进度（pending/proposed/accepted/confirmed/failed）与链上转会ID"""
+    _add_column(conn, 'transfers', 'chain_status', 'TEXT')
+    _add_column(conn, 'transfers', 'chain_transfer_id', 'INTEGER')
+
+
+# 按版本号排列的升级步骤: (版本, 说明, 执行函数)；每个步骤都可重复执行
+MIGRATIONS = [
+    (1, '初始表结构', _create_base_tables),
+    (2, '签名与金额列', _add_signature_and_amount_columns),
+    (3, '热点查询索引', _create_hot_query_indexes),
+    (4, '链上数据镜像', _create_chain_mirror_tables),
+    (5, '链上确认状态列', _add_chain_status_columns),
+    (6, '分页索引次排序列', _add_keyset_tiebreak_indexes),
+    (7, '索引线程心跳', _add_indexer_heartbeat_columns),
+]
+
+
+def get_connection(db_path: str):
+    """迁移使用自动提交模式的独立连接，事务由各步骤自行控制"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    apply_pragma_profile(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn
+
+
+def current_version(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(db_path: str = None, target: int = None) -> List[int]:
+    """按顺序应用未执行的迁移，返回本次应用的版本号"""
+    conn = get_connection(db_path or DatabaseConfig.DB_PATH)
+    applied = []
+    try:
+        version_now = current_version(conn)
+        for version, name, step in MIGRATIONS:
+            if version <= version_now or (target is not None and version > target):
+                continue
+            print(f"应用迁移 {version}: {name}")
+            step(conn)
+            with _transaction(conn):
+                conn.execute("INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)",
+                             (version, name))
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+# 热点查询及其应使用的索引: (说明, SQL, 参数, 期望索引)
+HOT_QUERIES = [
+    ('俱乐部球员列表', 'SELECT * FROM players WHERE current_club_id = ? ORDER BY jersey_number',
+     ('club_001',), 'idx_players_club_jersey'),
+    ('俱乐部未读通知',
+     'SELECT * FROM notifications WHERE club_id = ? AND is_read = 0 ORDER BY created_at DESC',
+     ('club_001',), 'idx_notifications_club_read'),
+    ('卖方LSH历史',
+     'SELECT transfer_fee, agent_commission, total_expense FROM transfers '
+     'WHERE selling_club_id = ? AND is_completed = 1 ORDER BY created_at DESC LIMIT 10',
+     ('club_001',), 'idx_transfers_seller_history'),
+    ('买方LSH历史',
+     'SELECT transfer_fee, agent_commission, total_expense FROM transfers '
+     'WHERE buying_club_id = ? AND is_completed = 1 ORDER BY created_at DESC LIMIT 10',
+     ('club_001',), 'idx_transfers_buyer_history'),
+    ('批量重新筛查',
+     'SELECT rowid, transfer_id FROM transfers WHERE is_completed = 1 '
+     'AND (created_at, rowid) > (?, ?) ORDER BY created_at, rowid LIMIT 5000',
+     ('', 0), 'idx_transfers_completed_created'),
+    ('转会记录导出', named_query('transfer_history_export'), (), 'idx_transfers_completed_at_id'),
+    ('转会验证记录', 'SELECT * FROM lsh_validations WHERE transfer_id = ?',
+     ('transfer_x',), 'idx_lsh_validations_transfer'),
+]
+
+# 列表接口的键集分页查询（首页与带游标的后续页）及其应使用的索引，SQL 与接口实际执行的完全相同
+PAGE_QUERY_INDEXES = {
+    'transferable_players': ('可转会球员', 'idx_players_status_value_id'),
+    'pending_offers': ('待处理报价', 'idx_offers_status_date_id'),
+    'transfer_history': ('转会历史', 'idx_transfers_completed_history'),
+    'unread_notifications': ('全部未读通知', 'idx_notifications_unread_id'),
+}
+for _name, (_description, _index_name) in PAGE_QUERY_INDEXES.items():
+    _select_sql, _conditions, _sort_keys = PAGE_QUERIES[_name]
+    HOT_QUERIES.append((f'{_description}首页', keyset_page_sql(_select_sql, _conditions, _sort_keys),
+                        (50,), _index_name))
+    HOT_QUERIES.append((f'{_description}后续页', keyset_page_sql(_select_sql, _conditions, _sort_keys, True),
+                        ('',) * len(_sort_keys) + (50,), _index_name))
+
+
+def check_query_plans(db_path: str = None) -> List[str]:
+    """用 EXPLAIN QUERY PLAN 检查热点查询是否使用了预期的索引且排序不需要临时B树，返回不满足的查询"""
+    conn = sqlite3.connect(db_path or DatabaseConfig.DB_PATH)
+    apply_pragma_profile(conn)
+    missing = []
+
+    for description, query, params, index_name in HOT_QUERIES:
+        plan = ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+        uses_index = index_name in plan and 'USE TEMP B-TREE' not in plan
+        print(f"{'✅' if uses_index else '❌'} {description}: {plan}")
+        if not uses_index:
+            missing.append(description)
+
+    conn.close()
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库结构迁移')
+    parser.add_argument('--db', default=DatabaseConfig.DB_PATH, help='数据库路径')
+    parser.add_argument('--target', type=int, default=None, help='只升级到指定版本')
+    parser.add_argument('--status', action='store_true', help='只显示当前版本')
+    parser.add_argument('--check-plans', action='store_true', help='检查热点查询的执行计划')
+    args = parser.parse_args()
+
+    if args.status:
+        conn = get_connection(args.db)
+        print(f"当前版本: {current_version(conn)} / 最新版本: {MIGRATIONS[-1][0]}")
+        conn.close()
+    elif args.check_plans:
+        raise SystemExit(1 if check_query_plans(args.db) else 0)
+    else:
+        applied = migrate(args.db, args.target)
+        print(f"已应用迁移: {applied}" if applied else "数据库已是最新版本")
+
+
+if __name__ == "__main__":
+    main()
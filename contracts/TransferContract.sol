@@ -39,6 +39,7 @@ contract TransferContract {
     mapping(address => bool) public registeredClubs;
     uint256 public transferCount;
     address public owner;
+    uint256[5] private statusCounts;  // 各状态的转会数量，按 TransferStatus 编号索引
 
     // 事件
     event ClubRegistered(address indexed clubAddress, string name);
@@ -63,6 +64,13 @@ contract TransferContract {
         owner = msg.sender;
     }
 
+    // 变更转会状态，同时维护各状态的计数
+    function _setStatus(Transfer storage transfer, TransferStatus _status) private {
+        statusCounts[uint256(transfer.status)]--;
+        transfer.status = _status;
+        statusCounts[uint256(_status)]++;
+    }
+
     // 注册俱乐部
     function registerClub(string memory _name, string memory _country) public {
         require(!registeredClubs[msg.sender], "Club already registered");
@@ -103,6 +111,7 @@ contract TransferContract {
             lshExpenseHash: "",
             isLegitimate: false
         });
+        statusCounts[uint256(TransferStatus.Proposed)]++;
 
         emit TransferProposed(transferCount, msg.sender, _buyingClub, _playerId, _transferFee);
     }
@@ -120,7 +129,7 @@ contract TransferContract {
 
         transfer.lshExpenseHash = _lshExpenseHash;
         transfer.acceptanceTimestamp = block.timestamp;
-        transfer.status = TransferStatus.Accepted;
+        _setStatus(transfer, TransferStatus.Accepted);
 
         emit TransferAccepted(_transferId, msg.sender);
     }
@@ -137,13 +146,13 @@ contract TransferContract {
 
         transfer.validationTimestamp = block.timestamp;
         transfer.isLegitimate = _isLegitimate;
-        transfer.status = TransferStatus.Validated;
 
+        // 验证后直接进入最终状态，Validated 不会停留
         if (_isLegitimate) {
-            transfer.status = TransferStatus.Completed;
+            _setStatus(transfer, TransferStatus.Completed);
             emit TransferCompleted(_transferId);
         } else {
-            transfer.status = TransferStatus.Rejected;
+            _setStatus(transfer, TransferStatus.Rejected);
             emit TransferRejected(_transferId, "Failed LSH validation");
         }
 
@@ -158,7 +167,7 @@ contract TransferContract {
         require(transfer.sellingClub == msg.sender, "Only selling club can cancel");
         require(transfer.status == TransferStatus.Proposed, "Can only cancel proposed transfers");
 
-        transfer.status = TransferStatus.Rejected;
+        _setStatus(transfer, TransferStatus.Rejected);
         emit TransferRejected(_transferId, "Cancelled by selling club");
     }
 
@@ -195,6 +204,26 @@ contract TransferContract {
         );
     }
 
+    // 批量查询：一次调用返回从 _startId 开始的最多 _count 笔转会，超出 transferCount 的部分截断
+    function getTransfersBatch(uint256 _startId, uint256 _count) public view returns (Transfer[] memory) {
+        require(_startId > 0, "Invalid transfer ID");
+
+        uint256 available = _startId > transferCount ? 0 : transferCount - _startId + 1;
+        uint256 size = _count < available ? _count : available;
+
+        Transfer[] memory results = new Transfer[](size);
+        for (uint256 i = 0; i < size; i++) {
+            results[i] = transfers[_startId + i];
+        }
+
+        return results;
+    }
+
+    // 各状态的转会数量，按 TransferStatus 编号排列
+    function getStatusCounts() public view returns (uint256[5] memory) {
+        return statusCounts;
+    }
+
     // 获取俱乐部信息
     function getClub(address _clubAddress) public view returns (Club memory) {
         return clubs[_clubAddress];
@@ -104,6 +104,7 @@ def deploy_contract():
     # 保存合约信息
     contract_data = {
         "address": tx_receipt.contractAddress,
+        "block_number": tx_receipt.blockNumber,  # 部署区块，链上事件索引从这里开始
         "abi": abi
     }
 
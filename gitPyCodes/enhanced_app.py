@@ -16,6 +16,9 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入现有模块
 from enhanced_transfer_manager import EnhancedTransferManager
+from config.database import DatabaseConfig, get_pool, fetch_named_page, named_query, iter_rows, iter_json_array
+from services.blockchain_service import BlockchainService
+from services.chain_indexer import ChainIndexer
 
 
 class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
@@ -41,10 +44,16 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
             self.serve_offers_data()
         elif parsed_path.path == '/api/history':
             self.serve_history_data()
+        elif parsed_path.path == '/api/history/export':
+            self.serve_history_export()
         elif parsed_path.path == '/api/notifications':
             self.serve_notifications_data()
         elif parsed_path.path == '/api/blockchain':
             self.serve_blockchain_data()
+        elif parsed_path.path == '/api/db_stats':
+            self.serve_db_stats()
+        elif parsed_path.path == '/api/transfer_status':
+            self.serve_transfer_status()
         else:
             super().do_GET()
 
@@ -452,6 +461,40 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
 
     <script>
         let allData = {};
+
+        // 分页接口通过 X-Next-Cursor 响应头返回下一页游标，没有更多数据时为空
+        const nextCursors = {};
+
+        async function fetchPage(name, url, append) {
+            const cursor = append ? nextCursors[name] : null;
+            const response = await fetch(cursor ? `${url}?cursor=${encodeURIComponent(cursor)}` : url);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            nextCursors[name] = response.headers.get('X-Next-Cursor');
+            return response.json();
+        }
+
+        // 渲染一页卡片：追加时接在已有卡片之后；还有下一页时在末尾显示"加载更多"按钮
+        function renderPage(name, containerId, html, append, listClass, loaderName) {
+            const container = document.getElementById(containerId);
+            const list = append ? container.querySelector('.page-items') : null;
+            if (list) {
+                list.insertAdjacentHTML('beforeend', html);
+            } else {
+                container.innerHTML = `<div class="page-items ${listClass}">${html}</div>`;
+            }
+
+            const oldButton = container.querySelector('.load-more');
+            if (oldButton) {
+                oldButton.remove();
+            }
+            if (nextCursors[name]) {
+                container.insertAdjacentHTML('beforeend',
+                    `<div class="load-more" style="margin-top: 10px; text-align: center;"><button class="btn" onclick="${loaderName}(true)">加载更多</button></div>`);
+            }
+            return container.querySelector('.page-items').children.length;
+        }
         let currentOffer = null;
 
         // 标签页切换
@@ -535,18 +578,17 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
         }
 
         // 加载球员数据
-        async function loadPlayers() {
+        async function loadPlayers(append = false) {
             try {
-                const response = await fetch('/api/players');
-                const data = await response.json();
-                allData.players = data;
+                const data = await fetchPage('players', '/api/players', append);
+                allData.players = append ? (allData.players || []).concat(data) : data;
 
-                if (data.length === 0) {
+                if (!append && data.length === 0) {
                     document.getElementById('players-content').innerHTML = '<div class="alert alert-warning">暂无可转会球员</div>';
                     return;
                 }
 
-                let html = '<div class="grid">';
+                let html = '';
                 data.forEach(player => {
                     html += `
                         <div class="card">
@@ -558,22 +600,20 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
                         </div>
                     `;
                 });
-                html += '</div>';
 
-                document.getElementById('players-content').innerHTML = html;
+                renderPage('players', 'players-content', html, append, 'grid', 'loadPlayers');
             } catch (error) {
                 document.getElementById('players-content').innerHTML = `<div class="alert alert-error">加载失败: ${error.message}</div>`;
             }
         }
 
         // 加载报价数据
-        async function loadOffers() {
+        async function loadOffers(append = false) {
             try {
-                const response = await fetch('/api/offers');
-                const data = await response.json();
-                allData.offers = data;
+                const data = await fetchPage('offers', '/api/offers', append);
+                allData.offers = append ? (allData.offers || []).concat(data) : data;
 
-                if (data.length === 0) {
+                if (!append && data.length === 0) {
                     document.getElementById('offers-content').innerHTML = '<div class="alert alert-warning">暂无转会报价</div>';
                     return;
                 }
@@ -597,19 +637,18 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
                     `;
                 });
 
-                document.getElementById('offers-content').innerHTML = html;
+                renderPage('offers', 'offers-content', html, append, '', 'loadOffers');
             } catch (error) {
                 document.getElementById('offers-content').innerHTML = `<div class="alert alert-error">加载失败: ${error.message}</div>`;
             }
         }
 
         // 加载历史数据
-        async function loadHistory() {
+        async function loadHistory(append = false) {
             try {
-                const response = await fetch('/api/history');
-                const data = await response.json();
+                const data = await fetchPage('history', '/api/history', append);
 
-                if (data.length === 0) {
+                if (!append && data.length === 0) {
                     document.getElementById('history-content').innerHTML = '<div class="alert alert-warning">暂无转会历史</div>';
                     return;
                 }
@@ -641,7 +680,7 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
                     `;
                 });
 
-                document.getElementById('history-content').innerHTML = html;
+                renderPage('history', 'history-content', html, append, '', 'loadHistory');
             } catch (error) {
                 document.getElementById('history-content').innerHTML = `<div class="alert alert-error">加载失败: ${error.message}</div>`;
             }
@@ -689,22 +728,13 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
         }
 
         // 加载通知数据
-        async function loadNotifications() {
+        async function loadNotifications(append = false) {
             try {
-                const response = await fetch('/api/notifications');
-                const data = await response.json();
-
-                // 更新通知计数
-                const count = data.length;
+                const data = await fetchPage('notifications', '/api/notifications', append);
                 const countEl = document.getElementById('notif-count');
-                if (count > 0) {
-                    countEl.textContent = `(${count})`;
-                    countEl.style.color = '#e74c3c';
-                } else {
-                    countEl.textContent = '';
-                }
 
-                if (data.length === 0) {
+                if (!append && data.length === 0) {
+                    countEl.textContent = '';
                     document.getElementById('notifications-content').innerHTML = '<div class="alert alert-warning">暂无新通知</div>';
                     return;
                 }
@@ -728,7 +758,10 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
                     `;
                 });
 
-                document.getElementById('notifications-content').innerHTML = html;
+                // 更新通知计数（已加载的条数，还有下一页时加"+"）
+                const count = renderPage('notifications', 'notifications-content', html, append, '', 'loadNotifications');
+                countEl.textContent = `(${count}${nextCursors.notifications ? '+' : ''})`;
+                countEl.style.color = '#e74c3c';
             } catch (error) {
                 document.getElementById('notifications-content').innerHTML = `<div class="alert alert-error">加载失败: ${error.message}</div>`;
             }
@@ -904,6 +937,30 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
         }
 
         // 处理完整转会
+        // 轮询转会的链上确认进度，完成或失败后刷新区块链相关数据
+        async function waitForChainConfirmation(transferId) {
+            for (let attempt = 0; attempt < 120; attempt++) {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                try {
+                    const response = await fetch('/api/transfer_status?transfer_id=' + encodeURIComponent(transferId));
+                    if (!response.ok) {
+                        return;
+                    }
+                    const status = await response.json();
+                    if (status.chain_status === 'confirmed' || status.chain_status === 'failed') {
+                        if (status.chain_status === 'failed') {
+                            alert('⚠️ 转会 ' + transferId + ' 的区块链确认失败，转会已在链下完成');
+                        }
+                        loadHistory();
+                        loadBlockchain();
+                        return;
+                    }
+                } catch (error) {
+                    return;
+                }
+            }
+        }
+
         async function processCompleteTransfer(event) {
             event.preventDefault();
 
@@ -951,8 +1008,11 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
                 const result = await response.json();
 
                 if (result.success) {
-                    alert('🎉 转会交易成功完成！已完成LSH验证和区块链三步确认。');
+                    alert('🎉 ' + result.message);
                     closeModal('transferModal');
+                    if (result.chain_status === 'pending') {
+                        waitForChainConfirmation(result.transfer_id);
+                    }
                     // 刷新数据
                     loadOffers();
                     loadHistory();
@@ -1001,35 +1061,13 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(html_content.encode())
 
     def get_db_connection(self):
-        conn = sqlite3.connect('football_transfer_enhanced.db')
-        conn.row_factory = sqlite3.Row
-        return conn
+        return get_pool('football_transfer_enhanced.db').acquire()
 
     def serve_clubs_data(self):
         try:
             conn = self.get_db_connection()
 
-            clubs = conn.execute("""
-                SELECT c.*, 
-                       COUNT(p.player_id) as player_count,
-                       COUNT(CASE WHEN p.transfer_status = 1 THEN 1 END) as transferable_count
-                FROM clubs c
-                LEFT JOIN players p ON c.club_id = p.current_club_id
-                GROUP BY c.club_id
-                ORDER BY c.name
-            """).fetchall()
-
-            clubs_data = []
-            for club in clubs:
-                club_dict = dict(club)
-
-                players = conn.execute("""
-                    SELECT * FROM players WHERE current_club_id = ? ORDER BY jersey_number
-                """, (club['club_id'],)).fetchall()
-
-                club_dict['players'] = [dict(player) for player in players]
-                clubs_data.append(club_dict)
-
+            clubs_data = EnhancedTransferManager.load_clubs_overview(conn)
             conn.close()
 
             self.send_response(200)
@@ -1040,100 +1078,143 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
         except Exception as e:
             self.send_error(500, str(e))
 
+    def _page_params(self):
+        """从查询字符串读取分页参数 limit 与 cursor"""
+        query = parse_qs(urlparse(self.path).query)
+        limit = query.get('limit', [None])[0]
+        cursor = query.get('cursor', [None])[0]
+        return (int(limit) if limit else None), cursor
+
+    def _send_json_page(self, rows, next_cursor):
+        """返回一页JSON列表，下一页游标放在 X-Next-Cursor 响应头中"""
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        if next_cursor:
+            self.send_header('X-Next-Cursor', next_cursor)
+        self.end_headers()
+        for chunk in iter_json_array(rows):
+            self.wfile.write(chunk)
+
     def serve_players_data(self):
         try:
+            limit, cursor = self._page_params()
             conn = self.get_db_connection()
 
-            players = conn.execute("""
-                SELECT p.*, c.name as club_name
-                FROM players p
-                JOIN clubs c ON p.current_club_id = c.club_id
-                WHERE p.transfer_status = 1
-                ORDER BY p.market_value DESC
-            """).fetchall()
+            players, next_cursor = fetch_named_page(conn, 'transferable_players', limit, cursor)
 
             conn.close()
+            self._send_json_page(players, next_cursor)
 
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps([dict(player) for player in players], default=str).encode())
-
+        except ValueError:
+            self.send_error(400, 'Invalid pagination parameters')
         except Exception as e:
             self.send_error(500, str(e))
 
     def serve_offers_data(self):
         try:
+            limit, cursor = self._page_params()
             conn = self.get_db_connection()
 
-            offers = conn.execute("""
-                SELECT o.*, p.name as player_name, p.position, p.market_value,
-                       oc.name as offering_club_name, rc.name as receiving_club_name
-                FROM transfer_offers o
-                JOIN players p ON o.player_id = p.player_id
-                JOIN clubs oc ON o.offering_club_id = oc.club_id
-                JOIN clubs rc ON o.receiving_club_id = rc.club_id
-                WHERE o.offer_status = 'pending'
-                ORDER BY o.offer_date DESC
-            """).fetchall()
+            offers, next_cursor = fetch_named_page(conn, 'pending_offers', limit, cursor)
 
             conn.close()
+            self._send_json_page(offers, next_cursor)
 
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps([dict(offer) for offer in offers], default=str).encode())
-
+        except ValueError:
+            self.send_error(400, 'Invalid pagination parameters')
         except Exception as e:
             self.send_error(500, str(e))
 
     def serve_history_data(self):
         try:
+            limit, cursor = self._page_params()
             conn = self.get_db_connection()
 
-            transfers = conn.execute("""
-                SELECT t.*, p.name as player_name, p.position,
-                       sc.name as selling_club_name, bc.name as buying_club_name,
-                       lv.similarity_score, lv.is_legitimate
-                FROM transfers t
-                JOIN players p ON t.player_id = p.player_id
-                JOIN clubs sc ON t.selling_club_id = sc.club_id
-                JOIN clubs bc ON t.buying_club_id = bc.club_id
-                LEFT JOIN lsh_validations lv ON t.transfer_id = lv.transfer_id
-                ORDER BY t.completed_at DESC
-            """).fetchall()
+            transfers, next_cursor = fetch_named_page(conn, 'transfer_history', limit, cursor)
+
+            conn.close()
+            self._send_json_page(transfers, next_cursor)
+
+        except ValueError:
+            self.send_error(400, 'Invalid pagination parameters')
+        except Exception as e:
+            self.send_error(500, str(e))
 
+    def serve_history_export(self):
+        """导出全部转会记录，边读边写JSON数组，不在内存中保留完整结果"""
+        conn = self.get_db_connection()
+        try:
+            rows = iter_rows(conn, named_query('transfer_history_export'))
+            chunks = iter_json_array(rows)
+            # 先取第一块，查询出错时还能返回500
+            first_chunk = next(chunks)
+        except Exception as e:
             conn.close()
+            self.send_error(500, str(e))
+            return
 
+        try:
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Disposition', 'attachment; filename="transfer_history.json"')
             self.end_headers()
-            self.wfile.write(json.dumps([dict(transfer) for transfer in transfers], default=str).encode())
-
+            self.wfile.write(first_chunk)
+            for chunk in chunks:
+                self.wfile.write(chunk)
         except Exception as e:
-            self.send_error(500, str(e))
+            print(f"导出转会记录中断: {e}")
+        finally:
+            chunks.close()
+            conn.close()
 
     def serve_notifications_data(self):
         try:
+            limit, cursor = self._page_params()
             conn = self.get_db_connection()
 
-            notifications = conn.execute("""
-                SELECT n.*, c.name as club_name
-                FROM notifications n
-                JOIN clubs c ON n.club_id = c.club_id
-                WHERE n.is_read = 0
-                ORDER BY n.created_at DESC
-            """).fetchall()
+            notifications, next_cursor = fetch_named_page(conn, 'unread_notifications', limit, cursor)
 
             conn.close()
+            self._send_json_page(notifications, next_cursor)
 
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps([dict(notif) for notif in notifications], default=str).encode())
+        except ValueError:
+            self.send_error(400, 'Invalid pagination parameters')
+        except Exception as e:
+            self.send_error(500, str(e))
 
+    def serve_db_stats(self):
+        """各SQL语句的执行次数、行数与耗时分位数"""
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(DatabaseConfig.query_stats(), ensure_ascii=False).encode())
+
+    def serve_transfer_status(self):
+        """转会的链上确认进度，供前端在后台三步确认期间轮询"""
+        transfer_id = parse_qs(urlparse(self.path).query).get('transfer_id', [None])[0]
+        if not transfer_id:
+            self.send_error(400, 'Missing transfer_id')
+            return
+
+        try:
+            conn = self.get_db_connection()
+            row = conn.execute("""
+                SELECT transfer_id, chain_status, chain_transfer_id, transaction_hash
+                FROM transfers WHERE transfer_id = ?
+            """, (transfer_id,)).fetchone()
+            conn.close()
         except Exception as e:
             self.send_error(500, str(e))
+            return
+
+        if row is None:
+            self.send_error(404, 'Transfer not found')
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(dict(row), ensure_ascii=False).encode())
 
     def serve_blockchain_data(self):
         try:
@@ -1148,13 +1229,7 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
             # 获取区块链数据
             summary = transfer_manager.blockchain_service.get_transfer_status_summary()
             total_transfers = transfer_manager.blockchain_service.get_transfer_count()
-
-            recent_transfers = []
-            if total_transfers > 0:
-                for i in range(max(1, total_transfers - 4), total_transfers + 1):
-                    details = transfer_manager.blockchain_service.get_transfer_details(i)
-                    if details:
-                        recent_transfers.append(details)
+            recent_transfers = transfer_manager.blockchain_service.get_recent_transfers(5)
 
             result = {
                 'success': True,
@@ -1357,6 +1432,17 @@ class CompleteTransferHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps({'success': False, 'error': str(e)}).encode())
 
 
+def start_chain_indexer():
+    """启动链上事件索引线程；镜像落后超过 CHAIN_MIRROR_MAX_LAG 个区块（如索引未运行）时只读查询直接访问节点"""
+    try:
+        blockchain_service = BlockchainService()
+        if blockchain_service.contract and blockchain_service.is_connected():
+            return ChainIndexer(blockchain_service).start()
+    except Exception as e:
+        print(f"链上索引未启动: {e}")
+    return None
+
+
 def start_complete_web_interface():
     """启动完整的Web界面"""
     # 检查数据库是否存在
@@ -1364,6 +1450,9 @@ def start_complete_web_interface():
         print("❌ 数据库不存在，请先运行 python init_database_enhanced.py")
         return False
 
+    # 后台同步链上事件到本地镜像，仪表盘读取不必等待区块链节点
+    start_chain_indexer()
+
     # 创建web目录（如果不存在）
     if not os.path.exists('web'):
         os.makedirs('web')
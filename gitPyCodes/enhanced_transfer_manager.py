@@ -15,8 +15,10 @@ import io
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from config.database import get_pool, named_query
 from services.lsh_service import LSHService
 from services.blockchain_service import BlockchainService
+from services.receipt_tracker import transfer_status_updater
 
 
 class EnhancedTransferManager:
@@ -30,10 +32,35 @@ class EnhancedTransferManager:
             self.blockchain_service = None
 
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取数据库连接（来自共享连接池）"""
+        return get_pool(self.db_path).acquire()
+
+    def _load_lsh_history(self, conn, club_id: str, role: str) -> List[Dict]:
+        """读取俱乐部最近的已完成转会并转换为LSH验证数据"""
+        history = conn.execute(named_query(f'club_history_{role}'),
+                               (club_id, self.lsh_service.history_window)).fetchall()
+        return self.lsh_service.prepare_history_data(history, role)
+
+    @staticmethod
+    def load_clubs_overview(conn) -> List[Dict]:
+        """一次性读取俱乐部、球员和教练（各一条查询），在内存中按俱乐部分组"""
+        clubs = [dict(club) for club in conn.execute("SELECT * FROM clubs ORDER BY name")]
+
+        players_by_club = {}
+        for player in conn.execute("SELECT * FROM players ORDER BY current_club_id, jersey_number"):
+            players_by_club.setdefault(player['current_club_id'], []).append(dict(player))
+
+        coach_by_club = {}
+        for coach in conn.execute("SELECT * FROM coaches"):
+            coach_by_club.setdefault(coach['current_club_id'], dict(coach))
+
+        for club in clubs:
+            players = players_by_club.get(club['club_id'], [])
+            club['player_count'] = len(players)
+            club['transferable_count'] = sum(1 for player in players if player['transfer_status'] == 1)
+            club['coach'] = coach_by_club.get(club['club_id'])
+            club['players'] = players
+        return clubs
 
     def display_all_clubs_info(self):
         """显示所有俱乐部的完整信息"""
@@ -42,17 +69,8 @@ class EnhancedTransferManager:
         print("=" * 80)
 
         conn = self.get_connection()
-
-        # 获取俱乐部基本信息
-        clubs = conn.execute("""
-            SELECT c.*, 
-                   COUNT(p.player_id) as player_count,
-                   COUNT(CASE WHEN p.transfer_status = 1 THEN 1 END) as transferable_count
-            FROM clubs c
-            LEFT JOIN players p ON c.club_id = p.current_club_id
-            GROUP BY c.club_id
-            ORDER BY c.name
-        """).fetchall()
+        clubs = self.load_clubs_overview(conn)
+        conn.close()
 
         for club in clubs:
             print(f"\n🏟️  {club['name']} ({club['country']})")
@@ -62,28 +80,17 @@ class EnhancedTransferManager:
             print(f"   余额: €{club['balance']:,.2f} | 转会预算: €{club['transfer_budget']:,.2f}")
             print(f"   球员总数: {club['player_count']} | 可转会球员: {club['transferable_count']}")
 
-            # 获取教练信息
-            coach = conn.execute("""
-                SELECT * FROM coaches WHERE current_club_id = ?
-            """, (club['club_id'],)).fetchone()
-
+            coach = club['coach']
             if coach:
                 print(f"   👨‍💼 主教练: {coach['name']} ({coach['nationality']}) - {coach['coaching_style']}")
 
-            # 获取球员信息
-            players = conn.execute("""
-                SELECT * FROM players WHERE current_club_id = ? ORDER BY jersey_number
-            """, (club['club_id'],)).fetchall()
-
             print(f"   👥 球员名单:")
-            for player in players:
+            for player in club['players']:
                 status = "🔄" if player['transfer_status'] else "🔒"
                 foot = {"Left": "左脚", "Right": "右脚"}.get(player['preferred_foot'], player['preferred_foot'])
                 print(
                     f"      {status} #{player['jersey_number']} {player['name']} ({player['position']}) - €{player['market_value']:,.0f} - {foot}")
 
-        conn.close()
-
     def display_transfer_market(self):
         """显示转会市场"""
         print("\n" + "=" * 60)
@@ -465,53 +472,9 @@ class EnhancedTransferManager:
         # 获取俱乐部历史数据进行LSH验证
         print(f"\n🔍 进行LSH验证...")
 
-        # 获取卖方转会历史
-        selling_history = conn.execute("""
-            SELECT transfer_fee, income_data, expense_data FROM transfers 
-            WHERE selling_club_id = ? AND is_completed = 1
-            ORDER BY created_at DESC LIMIT 10
-        """, (offer['receiving_club_id'],)).fetchall()
-
-        # 获取买方转会历史
-        buying_history = conn.execute("""
-            SELECT transfer_fee, income_data, expense_data FROM transfers 
-            WHERE buying_club_id = ? AND is_completed = 1
-            ORDER BY created_at DESC LIMIT 10
-        """, (offer['offering_club_id'],)).fetchall()
-
-        # 准备LSH验证数据
-        selling_data = []
-        for record in selling_history:
-            try:
-                income_info = json.loads(record['income_data']) if record['income_data'] else {}
-                selling_data.append({
-                    'transfer_fee': record['transfer_fee'],
-                    'player_market_value': record['transfer_fee'] * 1.1,  # 估算
-                    'additional_costs': income_info.get('agent_commission', record['transfer_fee'] * 0.05)
-                })
-            except:
-                selling_data.append({
-                    'transfer_fee': record['transfer_fee'],
-                    'player_market_value': record['transfer_fee'] * 1.1,
-                    'additional_costs': record['transfer_fee'] * 0.05
-                })
-
-        buying_data = []
-        for record in buying_history:
-            try:
-                expense_info = json.loads(record['expense_data']) if record['expense_data'] else {}
-                buying_data.append({
-                    'transfer_fee': record['transfer_fee'],
-                    'player_market_value': record['transfer_fee'] * 1.1,
-                    'additional_costs': expense_info.get('total_expense', record['transfer_fee'] * 0.1) - record[
-                        'transfer_fee']
-                })
-            except:
-                buying_data.append({
-                    'transfer_fee': record['transfer_fee'],
-                    'player_market_value': record['transfer_fee'] * 1.1,
-                    'additional_costs': record['transfer_fee'] * 0.1
-                })
+        # 获取双方转会历史并准备LSH验证数据
+        selling_data = self._load_lsh_history(conn, offer['receiving_club_id'], 'selling')
+        buying_data = self._load_lsh_history(conn, offer['offering_club_id'], 'buying')
 
         # 添加当前转会数据
         current_selling_data = {
@@ -529,7 +492,8 @@ class EnhancedTransferManager:
         buying_data.append(current_buying_data)
 
         # 进行LSH验证
-        validation_result = self.lsh_service.validate_transfer(selling_data, buying_data)
+        validation_result = self.lsh_service.validate_transfer(selling_data, buying_data,
+                                                               offer['receiving_club_id'], offer['offering_club_id'])
 
         print(f"LSH验证结果:")
         print(f"✓ 收入索引: {validation_result['income_index']}")
@@ -621,17 +585,23 @@ class EnhancedTransferManager:
                 if blockchain_results.get('validate'):
                     blockchain_tx_hash = blockchain_results['validate'].get('tx_hash')
 
+            income_signature = self.lsh_service.pack_index(validation_result['income_index'])
+            expense_signature = self.lsh_service.pack_index(validation_result['expense_index'])
+
             conn.execute("""
                 INSERT INTO transfers 
                 (transfer_id, player_id, selling_club_id, buying_club_id, transfer_fee, 
-                 additional_costs, income_data, expense_data, lsh_income_hash, lsh_expense_hash,
+                 additional_costs, agent_commission, total_expense, income_data, expense_data,
+                 lsh_income_hash, lsh_expense_hash, lsh_income_signature, lsh_expense_signature,
                  is_validated, is_completed, transaction_hash, completed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (transfer_id, offer['player_id'], offer['receiving_club_id'],
                   offer['offering_club_id'], offer['offer_amount'],
                   expense_data['total_expense'] - expense_data['transfer_fee'],
+                  income_data['agent_commission'], expense_data['total_expense'],
                   json.dumps(income_data), json.dumps(expense_data),
                   validation_result['income_index'], validation_result['expense_index'],
+                  income_signature, expense_signature,
                   1, 1,
                   blockchain_tx_hash,
                   datetime.now().isoformat()))
@@ -640,11 +610,12 @@ class EnhancedTransferManager:
             validation_id = f"validation_{uuid.uuid4().hex[:8]}"
             conn.execute("""
                 INSERT INTO lsh_validations 
-                (validation_id, transfer_id, income_index, expense_index, 
-                 similarity_score, is_legitimate, validation_details, risk_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (validation_id, transfer_id, income_index, expense_index, income_signature,
+                 expense_signature, similarity_score, is_legitimate, validation_details, risk_level)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (validation_id, transfer_id, validation_result['income_index'],
-                  validation_result['expense_index'], validation_result['similarity_score'],
+                  validation_result['expense_index'], income_signature, expense_signature,
+                  validation_result['similarity_score'],
                   1, validation_result['validation_details'], 'low'))
 
             # 更新球员信息
@@ -792,24 +763,22 @@ class EnhancedTransferManager:
                 print()
 
             # 显示具体转会详情
-            total_transfers = self.blockchain_service.get_transfer_count()
-            if total_transfers > 0:
+            recent_transfers = self.blockchain_service.get_recent_transfers(5)
+            if recent_transfers:
                 print("最近的转会记录:")
-                for i in range(max(1, total_transfers - 4), total_transfers + 1):
-                    details = self.blockchain_service.get_transfer_details(i)
-                    if details:
-                        print(f"\n转会 #{i}:")
-                        print(f"  状态: {details['status']}")
-                        print(f"  卖方: {details['sellingClub']}")
-                        print(f"  买方: {details['buyingClub']}")
-                        print(f"  球员ID: {details['playerId']}")
-                        print(f"  转会费: {details['transferFee']}")
-                        if details['proposalTimestamp'] > 0:
-                            print(f"  提议时间: {datetime.fromtimestamp(details['proposalTimestamp'])}")
-                        if details['acceptanceTimestamp'] > 0:
-                            print(f"  接受时间: {datetime.fromtimestamp(details['acceptanceTimestamp'])}")
-                        if details['validationTimestamp'] > 0:
-                            print(f"  验证时间: {datetime.fromtimestamp(details['validationTimestamp'])}")
+                for details in recent_transfers:
+                    print(f"\n转会 #{details['transferId']}:")
+                    print(f"  状态: {details['status']}")
+                    print(f"  卖方: {details['sellingClub']}")
+                    print(f"  买方: {details['buyingClub']}")
+                    print(f"  球员ID: {details['playerId']}")
+                    print(f"  转会费: {details['transferFee']}")
+                    if details['proposalTimestamp'] > 0:
+                        print(f"  提议时间: {datetime.fromtimestamp(details['proposalTimestamp'])}")
+                    if details['acceptanceTimestamp'] > 0:
+                        print(f"  接受时间: {datetime.fromtimestamp(details['acceptanceTimestamp'])}")
+                    if details['validationTimestamp'] > 0:
+                        print(f"  验证时间: {datetime.fromtimestamp(details['validationTimestamp'])}")
             else:
                 print("暂无区块链转会记录")
 
@@ -868,6 +837,24 @@ class EnhancedTransferManager:
                 print("\n\n👋 感谢使用足球转会系统！")
                 break
 
+    def _chain_progress_reporter(self, transfer_id: str):
+        """链上三步流程的进度回调：更新转会记录的链上状态并输出进度"""
+        update_status = transfer_status_updater(transfer_id, self.db_path)
+        messages = {
+            'proposed': "✅ 步骤1完成：卖方转会提议已确认",
+            'accepted': "✅ 步骤2完成：买方转会接受已确认",
+            'confirmed': "🎉 步骤3完成：监管方验证通过，三步确认流程全部完成",
+        }
+
+        def report(stage: str, result: Dict):
+            update_status(stage, result)
+            if stage == 'failed':
+                print(f"❌ 转会 {transfer_id} 区块链确认失败: {result.get('error', 'Unknown error')}")
+            else:
+                print(f"{messages[stage]}（转会 {transfer_id}，交易 {result.get('tx_hash', 'N/A')}）")
+
+        return report
+
     def process_transfer_transaction_api(self, offer_dict, income_data, expense_data):
         """API版本的转会交易处理方法 - 完整的LSH验证和区块链三步确认"""
         try:
@@ -882,53 +869,9 @@ class EnhancedTransferManager:
             # 获取俱乐部历史数据进行LSH验证
             print(f"\n🔍 进行LSH验证...")
 
-            # 获取卖方转会历史
-            selling_history = conn.execute("""
-                SELECT transfer_fee, income_data, expense_data FROM transfers 
-                WHERE selling_club_id = ? AND is_completed = 1
-                ORDER BY created_at DESC LIMIT 10
-            """, (offer_dict['receiving_club_id'],)).fetchall()
-
-            # 获取买方转会历史
-            buying_history = conn.execute("""
-                SELECT transfer_fee, income_data, expense_data FROM transfers 
-                WHERE buying_club_id = ? AND is_completed = 1
-                ORDER BY created_at DESC LIMIT 10
-            """, (offer_dict['offering_club_id'],)).fetchall()
-
-            # 准备LSH验证数据
-            selling_data = []
-            for record in selling_history:
-                try:
-                    income_info = json.loads(record['income_data']) if record['income_data'] else {}
-                    selling_data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': income_info.get('agent_commission', record['transfer_fee'] * 0.05)
-                    })
-                except:
-                    selling_data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': record['transfer_fee'] * 0.05
-                    })
-
-            buying_data = []
-            for record in buying_history:
-                try:
-                    expense_info = json.loads(record['expense_data']) if record['expense_data'] else {}
-                    buying_data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': expense_info.get('total_expense', record['transfer_fee'] * 0.1) - record[
-                            'transfer_fee']
-                    })
-                except:
-                    buying_data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': record['transfer_fee'] * 0.1
-                    })
+            # 获取双方转会历史并准备LSH验证数据
+            selling_data = self._load_lsh_history(conn, offer_dict['receiving_club_id'], 'selling')
+            buying_data = self._load_lsh_history(conn, offer_dict['offering_club_id'], 'buying')
 
             # 添加当前转会数据
             current_selling_data = {
@@ -946,7 +889,9 @@ class EnhancedTransferManager:
             buying_data.append(current_buying_data)
 
             # 进行LSH验证
-            validation_result = self.lsh_service.validate_transfer(selling_data, buying_data)
+            validation_result = self.lsh_service.validate_transfer(selling_data, buying_data,
+                                                                   offer_dict['receiving_club_id'],
+                                                                   offer_dict['offering_club_id'])
 
             print(f"📊 LSH验证结果:")
             print(f"   ✓ 收入索引: {validation_result['income_index']}")
@@ -961,8 +906,9 @@ class EnhancedTransferManager:
                 import uuid
                 transfer_id = f"transfer_{uuid.uuid4().hex[:8]}"
 
-                # 区块链三步确认流程
+                # 区块链三步确认流程在后台执行，HTTP请求不等待交易回执；进度写入 transfers.chain_status
                 blockchain_results = {}
+                submit_to_chain = False
 
                 if self.blockchain_service and self.blockchain_service.is_connected():
                     try:
@@ -974,59 +920,7 @@ class EnhancedTransferManager:
                                 print(f"   - {club['name']} ({club['address']})")
                             blockchain_results['error'] = 'Some clubs not registered on blockchain'
                         else:
-                            # 步骤1：卖方发起转会提议
-                            print("\n📝 步骤1：卖方发起转会提议...")
-                            propose_result = self.blockchain_service.propose_transfer(
-                                offer_dict['receiving_club_id'],  # 卖方俱乐部ID
-                                offer_dict['offering_club_id'],  # 买方俱乐部ID
-                                int(offer_dict['player_id'].replace('player_', ''), 16) % 1000000,
-                                int(offer_dict['offer_amount']),
-                                validation_result['income_index']
-                            )
-
-                            if propose_result and propose_result['success']:
-                                print("   ✅ 步骤1完成：卖方转会提议已提交")
-                                blockchain_transfer_id = propose_result['transfer_id']
-                                blockchain_results['propose'] = propose_result
-
-                                # 步骤2：买方接受转会
-                                print("\n🤝 步骤2：买方接受转会...")
-                                accept_result = self.blockchain_service.accept_transfer(
-                                    blockchain_transfer_id,
-                                    offer_dict['offering_club_id'],  # 买方俱乐部ID
-                                    validation_result['expense_index']
-                                )
-
-                                if accept_result and accept_result['success']:
-                                    print("   ✅ 步骤2完成：买方转会接受已确认")
-                                    blockchain_results['accept'] = accept_result
-
-                                    # 步骤3：监管方验证
-                                    print("\n⚖️ 步骤3：监管方验证转会...")
-                                    validate_result = self.blockchain_service.validate_transfer(
-                                        blockchain_transfer_id, True
-                                    )
-
-                                    if validate_result and validate_result['success']:
-                                        print("   ✅ 步骤3完成：监管方验证通过")
-                                        print("\n🎉 三步确认流程全部完成！")
-                                        blockchain_results['validate'] = validate_result
-                                        blockchain_results['success'] = True
-                                        blockchain_results['blockchain_transfer_id'] = blockchain_transfer_id
-                                    else:
-                                        print(
-                                            f"   ❌ 步骤3失败：监管验证错误 - {validate_result.get('error', 'Unknown error')}")
-                                        blockchain_results[
-                                            'error'] = f"Validation failed: {validate_result.get('error', 'Unknown error')}"
-                                else:
-                                    print(
-                                        f"   ❌ 步骤2失败：买方接受错误 - {accept_result.get('error', 'Unknown error')}")
-                                    blockchain_results[
-                                        'error'] = f"Accept failed: {accept_result.get('error', 'Unknown error')}"
-                            else:
-                                print(f"   ❌ 步骤1失败：卖方提议错误 - {propose_result.get('error', 'Unknown error')}")
-                                blockchain_results[
-                                    'error'] = f"Propose failed: {propose_result.get('error', 'Unknown error')}"
+                            submit_to_chain = True
 
                     except Exception as e:
                         print(f"❌ 区块链处理过程出错: {e}")
@@ -1035,34 +929,38 @@ class EnhancedTransferManager:
                     print("⚠️ 区块链未连接，模拟转会成功")
                     blockchain_results = {'success': True, 'simulated': True}
 
-                # 保存转会记录
-                blockchain_tx_hash = None
-                if blockchain_results.get('success'):
-                    if blockchain_results.get('validate'):
-                        blockchain_tx_hash = blockchain_results['validate'].get('tx_hash')
+                # 保存转会记录；交易哈希在链上验证确认后补写
+                chain_status = 'pending' if submit_to_chain else None
+
+                income_signature = self.lsh_service.pack_index(validation_result['income_index'])
+                expense_signature = self.lsh_service.pack_index(validation_result['expense_index'])
 
                 conn.execute("""
                     INSERT INTO transfers 
                     (transfer_id, player_id, selling_club_id, buying_club_id, transfer_fee, 
-                     additional_costs, income_data, expense_data, lsh_income_hash, lsh_expense_hash,
-                     is_validated, is_completed, transaction_hash, completed_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     additional_costs, agent_commission, total_expense, income_data, expense_data,
+                     lsh_income_hash, lsh_expense_hash, lsh_income_signature, lsh_expense_signature,
+                     is_validated, is_completed, transaction_hash, chain_status, completed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (transfer_id, offer_dict['player_id'], offer_dict['receiving_club_id'],
                       offer_dict['offering_club_id'], offer_dict['offer_amount'],
                       expense_data['total_expense'] - expense_data['transfer_fee'],
+                      income_data['agent_commission'], expense_data['total_expense'],
                       json.dumps(income_data), json.dumps(expense_data),
                       validation_result['income_index'], validation_result['expense_index'],
-                      1, 1, blockchain_tx_hash, datetime.now().isoformat()))
+                      income_signature, expense_signature,
+                      1, 1, None, chain_status, datetime.now().isoformat()))
 
                 # 保存LSH验证记录
                 validation_id = f"validation_{uuid.uuid4().hex[:8]}"
                 conn.execute("""
                     INSERT INTO lsh_validations 
-                    (validation_id, transfer_id, income_index, expense_index, 
-                     similarity_score, is_legitimate, validation_details, risk_level)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    (validation_id, transfer_id, income_index, expense_index, income_signature,
+                     expense_signature, similarity_score, is_legitimate, validation_details, risk_level)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (validation_id, transfer_id, validation_result['income_index'],
-                      validation_result['expense_index'], validation_result['similarity_score'],
+                      validation_result['expense_index'], income_signature, expense_signature,
+                      validation_result['similarity_score'],
                       1, validation_result['validation_details'], 'low'))
 
                 # 更新球员信息
@@ -1104,24 +1002,34 @@ class EnhancedTransferManager:
                 print(
                     f"   球员 {offer_dict['player_name']} 已从 {offer_dict['receiving_club_name']} 转会到 {offer_dict['offering_club_name']}")
 
-                # 显示区块链确认详情
-                if blockchain_results.get('success') and not blockchain_results.get('simulated'):
-                    print(f"\n📋 区块链确认详情:")
-                    print(
-                        f"   ✓ 步骤1 - 卖方提议交易哈希: {blockchain_results.get('propose', {}).get('tx_hash', 'N/A')}")
-                    print(
-                        f"   ✓ 步骤2 - 买方接受交易哈希: {blockchain_results.get('accept', {}).get('tx_hash', 'N/A')}")
-                    print(
-                        f"   ✓ 步骤3 - 监管验证交易哈希: {blockchain_results.get('validate', {}).get('tx_hash', 'N/A')}")
-                    print(f"   ✓ 区块链转会ID: {blockchain_results.get('blockchain_transfer_id', 'N/A')}")
+                # 转会记录已提交后再发起链上流程，进度回调按 transfer_id 更新记录
+                if submit_to_chain:
+                    print("\n📝 区块链三步确认流程已提交，正在后台等待交易确认...")
+                    outcome = self.blockchain_service.submit_transfer_protocol(
+                        offer_dict['receiving_club_id'],  # 卖方俱乐部ID
+                        offer_dict['offering_club_id'],  # 买方俱乐部ID
+                        int(offer_dict['player_id'].replace('player_', ''), 16) % 1000000,
+                        int(offer_dict['offer_amount']),
+                        validation_result['income_index'],
+                        validation_result['expense_index'],
+                        on_update=self._chain_progress_reporter(transfer_id)
+                    )
+                    # 第一笔交易发送失败时流程已结束（回调已把记录标记为 failed），返回实际状态
+                    if outcome.done():
+                        blockchain_results = outcome.result()
+                        chain_status = 'confirmed' if blockchain_results.get('success') else 'failed'
+                    else:
+                        blockchain_results = {'success': True, 'pending': True}
                 elif blockchain_results.get('error'):
                     print(f"\n⚠️ 区块链处理警告: {blockchain_results['error']}")
                     print("   转会在链下完成，但区块链记录可能不完整")
 
                 return {
                     'success': True,
-                    'message': '转会交易成功完成！已完成LSH验证和区块链三步确认。',
+                    'message': ('转会交易已完成LSH验证，区块链三步确认正在后台进行。' if chain_status == 'pending'
+                                else '转会交易成功完成！已完成LSH验证。'),
                     'transfer_id': transfer_id,
+                    'chain_status': chain_status,
                     'lsh_result': validation_result,
                     'blockchain_result': blockchain_results
                 }
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+压测数据生成工具
+按给定规模生成俱乐部、教练、球员、报价、已完成转会和通知，
+全部数据在一个事务内分批 executemany 写入；LSH验证记录随后由批量重新筛查服务计算。
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 添加项目根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.database import apply_pragma_profile
+from config.migrations import migrate
+from services.lsh_service import LSHService
+from services.rescreen_service import BulkRescreenService
+
+LEAGUES = [
+    ('England', 'Premier League'), ('Spain', 'La Liga'), ('Germany', 'Bundesliga'),
+    ('Italy', 'Serie A'), ('France', 'Ligue 1'), ('Netherlands', 'Eredivisie'),
+    ('Portugal', 'Primeira Liga'), ('Brazil', 'Serie A Brazil'),
+]
+POSITIONS = ['Goalkeeper', 'Defender', 'Midfielder', 'Forward']
+POSITION_WEIGHTS = [0.1, 0.35, 0.35, 0.2]
+COACHING_STYLES = ['Attacking', 'Possession', 'Tactical', 'Gegenpressing', 'Counter-attack', 'Flexible']
+OFFER_STATUSES = ['pending', 'accepted', 'rejected', 'expired']
+OFFER_STATUS_WEIGHTS = [0.2, 0.3, 0.4, 0.1]
+
+START_DATE = datetime(2015, 1, 1)
+
+
+def _timestamp(value: datetime) -> str:
+    """与 CURRENT_TIMESTAMP 相同的时间格式"""
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _transfer_window(value: datetime) -> str:
+    return f"{value.year} {'Winter' if value.month <= 6 else 'Summer'}"
+
+
+def _window_times(rng, count: int, years: int) -> list:
+    """按转会窗口生成有序的时间：夏窗（7-8月）占多数，冬窗（1月）其次，窗口外少量"""
+    season = rng.integers(0, years, count)
+    window = rng.choice(3, count, p=[0.65, 0.25, 0.1])
+    day_of_window = np.where(window == 0, 181 + rng.integers(0, 62, count),
+                             np.where(window == 1, rng.integers(0, 31, count), rng.integers(0, 365, count)))
+    seconds = rng.integers(0, 86400, count)
+    offsets = np.sort(season * 365 * 86400 + day_of_window * 86400 + seconds)
+    return [START_DATE + timedelta(seconds=int(offset)) for offset in offsets]
+
+
+def _batched(rows, batch_size: int):
+    """把行生成器切成固定大小的批次"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class LoadDataGenerator:
+    """按规模生成压测数据
+
+    俱乐部的转会活跃度服从帕累托分布（少数俱乐部交易频繁），身价、转会费、工资服从对数正态分布；
+    转会按时间顺序生成，球员随转会更换俱乐部，卖方总是球员当时所在的俱乐部。
+    """
+
+    def __init__(self, db_path, clubs=200, players=20000, transfers=100000, offers=20000,
+                 years=10, seed=42, batch_size=10000, anomaly_rate=0.02):
+        self.db_path = db_path
+        self.clubs = clubs
+        self.players = players
+        self.transfers = transfers
+        self.offers = offers
+        self.years = years
+        self.batch_size = batch_size
+        self.anomaly_rate = anomaly_rate
+        self.rng = np.random.default_rng(seed)
+
+        # 俱乐部活跃度权重与球员当前所在俱乐部，生成转会时更新
+        self.club_ids = [f"club_{index:06d}" for index in range(self.clubs)]
+        activity = self.rng.pareto(1.5, self.clubs) + 1
+        self.club_weights = activity / activity.sum()
+        self.player_ids = [f"player_{index:07d}" for index in range(self.players)]
+        self.player_clubs = self.rng.choice(self.clubs, self.players, p=self.club_weights)
+        self.market_values = np.round(self.rng.lognormal(np.log(20000), 1.0, self.players), 2)
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        apply_pragma_profile(conn)
+        return conn
+
+    def _club_rows(self):
+        balances = self.rng.lognormal(np.log(15000), 0.6, self.clubs)
+        for index, club_id in enumerate(self.club_ids):
+            country, league = LEAGUES[index % len(LEAGUES)]
+            yield (club_id, f"Load Test Club {index}", country, league, f"City {index}",
+                   int(self.rng.integers(1870, 1990)), f"Stadium {index}",
+                   f"0x{index + 1:040x}", f"0x{index + 1:064x}",
+                   round(float(balances[index]), 2), round(float(balances[index] * 7), 2))
+
+    def _coach_rows(self):
+        salaries = self.rng.lognormal(np.log(10000), 0.4, self.clubs)
+        for index, club_id in enumerate(self.club_ids):
+            contract_start = START_DATE + timedelta(days=int(self.rng.integers(0, self.years * 365)))
+            yield (f"coach_{index:06d}", f"Load Test Coach {index}", LEAGUES[index % len(LEAGUES)][0],
+                   None, None, club_id, COACHING_STYLES[index % len(COACHING_STYLES)], None,
+                   contract_start.date().isoformat(),
+                   (contract_start + timedelta(days=3 * 365)).date().isoformat(),
+                   round(float(salaries[index]), 2))
+
+    def _player_rows(self, final_clubs):
+        positions = self.rng.choice(len(POSITIONS), self.players, p=POSITION_WEIGHTS)
+        heights = np.round(self.rng.normal(1.81, 0.07, self.players), 2)
+        weights = np.round(self.rng.normal(76, 7, self.players), 1)
+        salaries = np.round(self.market_values * self.rng.uniform(0.15, 0.35, self.players), 2)
+        transfer_status = self.rng.random(self.players) < 0.15
+        birth_days = self.rng.integers(0, 18 * 365, self.players)
+        # 每个俱乐部内按顺序分配球衣号码
+        next_jersey = {}
+        for index, player_id in enumerate(self.player_ids):
+            club_id = self.club_ids[final_clubs[index]]
+            jersey = next_jersey.get(club_id, 1)
+            next_jersey[club_id] = jersey + 1
+            birth_date = datetime(1985, 1, 1) + timedelta(days=int(birth_days[index]))
+            yield (player_id, f"Load Test Player {index}", f"Load Test Player {index}",
+                   POSITIONS[positions[index]], LEAGUES[index % len(LEAGUES)][0], None,
+                   birth_date.date().isoformat(), float(heights[index]), float(weights[index]),
+                   'Left' if index % 4 == 0 else 'Right', club_id, float(self.market_values[index]),
+                   int(transfer_status[index]), jersey, None, None, float(salaries[index]), None, None)
+
+    def _transfer_rows(self, stats):
+        """按时间顺序生成转会，同时产出两条完成通知"""
+        times = _window_times(self.rng, self.transfers, self.years)
+        movers = self.rng.integers(0, self.players, self.transfers)
+        buyers = self.rng.choice(self.clubs, self.transfers, p=self.club_weights)
+        fee_factors = self.rng.lognormal(0, 0.3, self.transfers)
+        commission_rates = self.rng.uniform(0.03, 0.1, self.transfers)
+        expense_rates = self.rng.uniform(0.05, 0.2, self.transfers)
+        read_flags = self.rng.random(self.transfers) < 0.8
+        # 少量异常转会：佣金和总支出远高于转会费的离群值
+        anomalies = self.rng.random(self.transfers) < self.anomaly_rate
+        anomaly_factors = self.rng.uniform(2, 6, self.transfers)
+
+        for index in range(self.transfers):
+            player = int(movers[index])
+            seller = int(self.player_clubs[player])
+            buyer = int(buyers[index])
+            if buyer == seller:
+                buyer = (buyer + 1) % self.clubs
+            self.player_clubs[player] = buyer
+
+            transfer_id = f"transfer_{index:08d}"
+            fee = round(float(self.market_values[player] * fee_factors[index]), 2)
+            commission = round(fee * float(commission_rates[index]), 2)
+            total_expense = round(fee * (1 + float(expense_rates[index])), 2)
+            if anomalies[index]:
+                commission = round(fee * float(anomaly_factors[index]) / 4, 2)
+                total_expense = round(fee * float(anomaly_factors[index]), 2)
+            income_data = {'transfer_fee': fee, 'agent_commission': commission,
+                           'other_income': 0, 'total_income': round(fee + commission, 2)}
+            expense_data = {'transfer_fee': fee, 'agent_commission': commission,
+                            'signing_bonus': round(total_expense - fee - commission, 2),
+                            'medical_costs': 0, 'other_costs': 0, 'total_expense': total_expense}
+            created_at = times[index]
+            completed_at = _timestamp(created_at + timedelta(hours=int(self.rng.integers(1, 72))))
+            seller_id, buyer_id = self.club_ids[seller], self.club_ids[buyer]
+
+            stats['transfers'] += 1
+            yield ('transfer', (transfer_id, self.player_ids[player], seller_id, buyer_id, fee,
+                                round(total_expense - fee, 2), commission, total_expense,
+                                json.dumps(income_data), json.dumps(expense_data),
+                                f"0x{index:064x}", 1, 1, _transfer_window(created_at),
+                                _timestamp(created_at), completed_at))
+            for suffix, club_id, title in (('s', seller_id, '转会完成'), ('b', buyer_id, '签约完成')):
+                yield ('notification', (f"notification_{index:08d}{suffix}", club_id, 'transfer_completed',
+                                        title, f"转会 {transfer_id} 已完成", None, transfer_id,
+                                        int(read_flags[index]), completed_at))
+
+    def _offer_rows(self, stats):
+        """生成报价，每条报价给接收方产出一条通知"""
+        times = _window_times(self.rng, self.offers, self.years)
+        players = self.rng.integers(0, self.players, self.offers)
+        offering = self.rng.choice(self.clubs, self.offers, p=self.club_weights)
+        statuses = self.rng.choice(len(OFFER_STATUSES), self.offers, p=OFFER_STATUS_WEIGHTS)
+        amount_factors = self.rng.lognormal(0, 0.25, self.offers)
+
+        for index in range(self.offers):
+            player = int(players[index])
+            receiving = int(self.player_clubs[player])
+            offering_club = int(offering[index])
+            if offering_club == receiving:
+                offering_club = (offering_club + 1) % self.clubs
+            offer_id = f"offer_{index:08d}"
+            status = OFFER_STATUSES[statuses[index]]
+            offer_date = times[index]
+            response_date = None if status == 'pending' else _timestamp(offer_date + timedelta(days=2))
+
+            stats['offers'] += 1
+            yield ('offer', (offer_id, self.player_ids[player], self.club_ids[offering_club],
+                             self.club_ids[receiving],
+                             round(float(self.market_values[player] * amount_factors[index]), 2),
+                             None, status, _timestamp(offer_date),
+                             _timestamp(offer_date + timedelta(days=7)), response_date))
+            yield ('notification', (f"notification_o{index:08d}", self.club_ids[receiving], 'offer_received',
+                                    '收到转会报价', f"收到报价 {offer_id}", offer_id, None,
+                                    int(status != 'pending'), _timestamp(offer_date)))
+
+    def _write_mixed(self, conn, rows):
+        """转会/报价与通知交替产出，按类型分别累积成批写入"""
+        statements = {
+            'transfer': """
+                INSERT INTO transfers
+                (transfer_id, player_id, selling_club_id, buying_club_id, transfer_fee,
+                 additional_costs, agent_commission, total_expense, income_data, expense_data,
+                 transaction_hash, is_validated, is_completed, transfer_window, created_at, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            'offer': """
+                INSERT INTO transfer_offers
+                (offer_id, player_id, offering_club_id, receiving_club_id, offer_amount,
+                 additional_terms, offer_status, offer_date, expiry_date, response_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            'notification': """
+                INSERT INTO notifications
+                (notification_id, club_id, message_type, title, message, related_offer_id,
+                 related_transfer_id, is_read, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+        }
+        batches = {kind: [] for kind in statements}
+        for kind, row in rows:
+            batch = batches[kind]
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                conn.executemany(statements[kind], batch)
+                batch.clear()
+        for kind, batch in batches.items():
+            if batch:
+                conn.executemany(statements[kind], batch)
+
+    def generate(self):
+        """在一个事务内写入全部数据"""
+        conn = self.get_connection()
+        stats = {'clubs': self.clubs, 'coaches': self.clubs, 'players': self.players,
+                 'transfers': 0, 'offers': 0}
+        started = time.time()
+        try:
+            if conn.execute("SELECT COUNT(*) FROM clubs").fetchone()[0] > 0:
+                return {'success': False, 'error': '数据库已有数据，请使用 --reset 重新生成'}
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("""
+                INSERT INTO clubs (club_id, name, country, league, city, founded_year, stadium,
+                                   wallet_address, private_key, balance, transfer_budget)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, self._club_rows())
+            conn.executemany("""
+                INSERT INTO coaches (coach_id, name, nationality, birth_place, birth_date, current_club_id,
+                                     coaching_style, major_achievements, contract_start, contract_end, salary)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, self._coach_rows())
+
+            # 先生成转会（会改变球员所在俱乐部），再按最终归属写入球员和报价
+            self._write_mixed(conn, self._transfer_rows(stats))
+            for batch in _batched(self._player_rows(self.player_clubs), self.batch_size):
+                conn.executemany("""
+                    INSERT INTO players (player_id, name, english_name, position, nationality, birth_place,
+                                         birth_date, height, weight, preferred_foot, current_club_id,
+                                         market_value, transfer_status, jersey_number, contract_start,
+                                         contract_end, salary, major_achievements, club_career_history)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+            self._write_mixed(conn, self._offer_rows(stats))
+            conn.execute("COMMIT")
+
+            stats['elapsed_seconds'] = round(time.time() - started, 2)
+            return {'success': True, **stats}
+
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"生成压测数据错误: {e}")
+            return {'success': False, 'error': str(e)}
+
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成压测用的大规模数据')
+    parser.add_argument('--db', default='football_transfer_load.db', help='数据库路径')
+    parser.add_argument('--clubs', type=int, default=200, help='俱乐部数量')
+    parser.add_argument('--players', type=int, default=20000, help='球员数量')
+    parser.add_argument('--transfers', type=int, default=100000, help='已完成转会数量')
+    parser.add_argument('--offers', type=int, default=20000, help='报价数量')
+    parser.add_argument('--years', type=int, default=10, help='数据覆盖的赛季数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--batch-size', type=int, default=10000, help='每次 executemany 的行数')
+    parser.add_argument('--anomaly-rate', type=float, default=0.02, help='异常转会所占比例')
+    parser.add_argument('--workers', type=int, default=1, help='计算LSH验证记录的工作进程数')
+    parser.add_argument('--skip-validations', action='store_true', help='不计算LSH验证记录')
+    parser.add_argument('--reset', action='store_true', help='删除已有的数据库文件')
+    args = parser.parse_args()
+
+    if args.clubs < 2:
+        parser.error('至少需要2个俱乐部')
+
+    if args.reset:
+        for path in (args.db, f"{args.db}-wal", f"{args.db}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    migrate(args.db)
+    result = LoadDataGenerator(args.db, args.clubs, args.players, args.transfers, args.offers,
+                               args.years, args.seed, args.batch_size, args.anomaly_rate).generate()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if not result['success']:
+        sys.exit(1)
+
+    # 按时间顺序重放全部转会，写入与在线验证一致的LSH验证记录
+    if not args.skip_validations:
+        rescreen = BulkRescreenService(args.db, LSHService()).rescreen(args.workers)
+        print(json.dumps(rescreen, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,162 +6,37 @@ import io
 import sys
 # sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='gb18030')  # 改变标准输出的默认编码
 
+# 添加项目根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def init_enhanced_database():
-    """初始化增强版SQLite数据库"""
+from config.database import apply_pragma_profile
+from config.migrations import migrate, check_query_plans
+
+
+def init_enhanced_database(reset=False):
+    """初始化增强版SQLite数据库：执行结构迁移，空数据库时插入测试数据"""
     db_path = 'football_transfer_enhanced.db'
 
-    # 如果数据库文件已存在，删除它以重新创建
-    if os.path.exists(db_path):
-        os.remove(db_path)
+    # 只有明确要求重置时才删除旧数据库（WAL模式下连同日志文件一起删除）
+    if reset:
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
         print("已删除旧数据库文件")
 
-    # 创建新数据库连接
+    # 创建或升级表结构
+    applied = migrate(db_path)
+    if applied:
+        print(f"已应用迁移: {applied}")
+
     conn = sqlite3.connect(db_path)
+    apply_pragma_profile(conn)
     cursor = conn.cursor()
 
-    # 创建俱乐部表（增强版）
-    cursor.execute('''
-    CREATE TABLE clubs (
-        club_id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        country TEXT,
-        league TEXT,
-        city TEXT,
-        founded_year INTEGER,
-        stadium TEXT,
-        wallet_address TEXT UNIQUE,
-        private_key TEXT,
-        balance DECIMAL(15,2) DEFAULT 0,
-        transfer_budget DECIMAL(15,2) DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # 创建教练表
-    cursor.execute('''
-    CREATE TABLE coaches (
-        coach_id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        nationality TEXT,
-        birth_place TEXT,
-        birth_date DATE,
-        current_club_id TEXT,
-        coaching_style TEXT,
-        major_achievements TEXT,
-        contract_start DATE,
-        contract_end DATE,
-        salary DECIMAL(12,2),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (current_club_id) REFERENCES clubs(club_id)
-    )
-    ''')
-
-    # 创建球员表（增强版）
-    cursor.execute('''
-    CREATE TABLE players (
-        player_id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        english_name TEXT,
-        position TEXT,
-        nationality TEXT,
-        birth_place TEXT,
-        birth_date DATE,
-        height DECIMAL(3,2),
-        weight DECIMAL(5,2),
-        preferred_foot TEXT,
-        current_club_id TEXT,
-        market_value DECIMAL(12,2),
-        transfer_status BOOLEAN DEFAULT 0,
-        jersey_number INTEGER,
-        contract_start DATE,
-        contract_end DATE,
-        salary DECIMAL(12,2),
-        major_achievements TEXT,
-        club_career_history TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (current_club_id) REFERENCES clubs(club_id)
-    )
-    ''')
-
-    # 创建转会报价表
-    cursor.execute('''
-    CREATE TABLE transfer_offers (
-        offer_id TEXT PRIMARY KEY,
-        player_id TEXT,
-        offering_club_id TEXT,
-        receiving_club_id TEXT,
-        offer_amount DECIMAL(12,2),
-        additional_terms TEXT,
-        offer_status TEXT DEFAULT 'pending',  -- pending, accepted, rejected, expired
-        offer_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        expiry_date TIMESTAMP,
-        response_date TIMESTAMP,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (player_id) REFERENCES players(player_id),
-        FOREIGN KEY (offering_club_id) REFERENCES clubs(club_id),
-        FOREIGN KEY (receiving_club_id) REFERENCES clubs(club_id)
-    )
-    ''')
-
-    # 创建转会记录表（增强版）
-    cursor.execute('''
-    CREATE TABLE transfers (
-        transfer_id TEXT PRIMARY KEY,
-        player_id TEXT,
-        selling_club_id TEXT,
-        buying_club_id TEXT,
-        transfer_fee DECIMAL(12,2),
-        additional_costs DECIMAL(12,2) DEFAULT 0,
-        income_data TEXT,  -- JSON格式存储收入数据
-        expense_data TEXT,  -- JSON格式存储支出数据
-        transaction_hash TEXT,
-        lsh_income_hash TEXT,
-        lsh_expense_hash TEXT,
-        is_validated BOOLEAN DEFAULT 0,
-        is_completed BOOLEAN DEFAULT 0,
-        transfer_window TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        completed_at TIMESTAMP,
-        FOREIGN KEY (player_id) REFERENCES players(player_id),
-        FOREIGN KEY (selling_club_id) REFERENCES clubs(club_id),
-        FOREIGN KEY (buying_club_id) REFERENCES clubs(club_id)
-    )
-    ''')
-
-    # 创建消息通知表
-    cursor.execute('''
-    CREATE TABLE notifications (
-        notification_id TEXT PRIMARY KEY,
-        club_id TEXT,
-        message_type TEXT,  -- offer_received, offer_accepted, offer_rejected, transfer_completed
-        title TEXT,
-        message TEXT,
-        related_offer_id TEXT,
-        related_transfer_id TEXT,
-        is_read BOOLEAN DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (club_id) REFERENCES clubs(club_id),
-        FOREIGN KEY (related_offer_id) REFERENCES transfer_offers(offer_id),
-        FOREIGN KEY (related_transfer_id) REFERENCES transfers(transfer_id)
-    )
-    ''')
-
-    # 创建LSH验证记录表（增强版）
-    cursor.execute('''
-    CREATE TABLE lsh_validations (
-        validation_id TEXT PRIMARY KEY,
-        transfer_id TEXT,
-        income_index TEXT,
-        expense_index TEXT,
-        similarity_score DECIMAL(5,4),
-        is_legitimate BOOLEAN,
-        validation_details TEXT,
-        risk_level TEXT,  -- low, medium, high
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (transfer_id) REFERENCES transfers(transfer_id)
-    )
-    ''')
+    if cursor.execute("SELECT COUNT(*) FROM clubs").fetchone()[0] > 0:
+        conn.close()
+        print(f"数据库已有数据，跳过测试数据插入: {db_path}")
+        return
 
     # 使用 Ganache 提供的前5个账户地址和私钥。（具体的地址和密钥请从自己的ganache账号数据中获取）
     ganache_accounts = [
@@ -266,6 +141,7 @@ def init_enhanced_database():
     # 验证数据插入
     try:
         conn = sqlite3.connect(db_path)
+        apply_pragma_profile(conn)
         cursor = conn.cursor()
 
         cursor.execute("SELECT COUNT(*) FROM clubs")
@@ -294,11 +170,18 @@ def init_enhanced_database():
 
 
 if __name__ == "__main__":
+    if '--migrate' in sys.argv:
+        migrate('football_transfer_enhanced.db')
+        sys.exit(0)
+
+    if '--check-plans' in sys.argv:
+        sys.exit(1 if check_query_plans('football_transfer_enhanced.db') else 0)
+
     print("开始初始化增强版数据库...")
     print("=" * 60)
 
     try:
-        init_enhanced_database()
+        init_enhanced_database(reset='--reset' in sys.argv)
     except Exception as e:
         print(f"❌ 数据库初始化失败: {e}")
         print("请检查:")
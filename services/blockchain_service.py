@@ -1,16 +1,99 @@
 import json
 import os
-import sqlite3
+import threading
+from collections.abc import Mapping
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
 from web3 import Web3
 from dotenv import load_dotenv
 
+from config.database import DatabaseConfig, get_pool
+from services.chain_indexer import ChainMirror, EVENT_TOPICS, _hex
+from services.receipt_tracker import get_receipt_tracker
+
 load_dotenv()
 
 
+def _plain(value):
+    """把 web3 返回的 AttributeDict/HexBytes 转换为普通的 dict/list/十六进制字符串，结果可直接 JSON 编码"""
+    if isinstance(value, (bytes, bytearray)):
+        return _hex(value)
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+class NonceManager:
+    """按账户在本地分配交易nonce
+
+    每个地址首次使用时从节点读取 pending 状态的交易数，之后在本地递增，
+    同一账户可以连续提交多笔交易而不必等待前一笔的回执。
+    签名或发送失败（包括发送超时）以及等待回执超时（交易可能已被节点丢弃，留下nonce空洞）时
+    丢弃本地计数，下次从节点的 pending 交易数重新同步。
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._next_nonces = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _address_lock(self, address: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(address)
+            if lock is None:
+                lock = self._locks[address] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def reserve(self, address: str):
+        """分配下一个nonce；with 块内发送交易，块内出错时该nonce不被占用并触发重新同步"""
+        with self._address_lock(address):
+            nonce = self._next_nonces.get(address)
+            if nonce is None:
+                nonce = self.w3.eth.get_transaction_count(address, 'pending')
+            try:
+                yield nonce
+            except Exception:
+                self._next_nonces.pop(address, None)
+                raise
+            self._next_nonces[address] = nonce + 1
+
+    def resync(self, address: str = None):
+        """丢弃本地计数（例如账户在其他进程中发送了交易，或交易等待回执超时）"""
+        if address is None:
+            self._next_nonces.clear()
+        else:
+            self._next_nonces.pop(address, None)
+
+
+_nonce_managers = {}
+_nonce_managers_lock = threading.Lock()
+
+
+def get_nonce_manager(w3, rpc_url: str) -> NonceManager:
+    """按节点地址获取共享的nonce管理器，同一进程内的所有 BlockchainService 共用"""
+    with _nonce_managers_lock:
+        manager = _nonce_managers.get(rpc_url)
+        if manager is None:
+            manager = _nonce_managers[rpc_url] = NonceManager(w3)
+        return manager
+
+
 class BlockchainService:
+    # 合约 TransferStatus 枚举按状态码排列的名称
+    STATUS_NAMES = ["Proposed", "Accepted", "Validated", "Completed", "Rejected"]
+
     def __init__(self):
         self.w3 = Web3(Web3.HTTPProvider(os.getenv('GANACHE_URL')))
         self.chain_id = int(os.getenv('CHAIN_ID'))
+        self.nonce_manager = get_nonce_manager(self.w3, os.getenv('GANACHE_URL'))
+        self._owner = None
+        # 批量读取转会时每次RPC包含的转会数
+        self.batch_size = int(os.getenv('BLOCKCHAIN_BATCH_SIZE', 200))
 
         # 默认管理员账户（用于部署合约和验证转会）
         self.admin_address = self._ensure_checksum_address(os.getenv('ACCOUNT_ADDRESS'))
@@ -21,14 +104,27 @@ class BlockchainService:
             with open('contract_info.json', 'r') as f:
                 contract_info = json.load(f)
                 self.contract_address = self._ensure_checksum_address(contract_info['address'])
+                self.deployment_block = contract_info.get('block_number', 0)
                 self.contract_abi = contract_info['abi']
                 self.contract = self.w3.eth.contract(
                     address=self.contract_address,
                     abi=self.contract_abi
                 )
+                # 旧版本部署的合约没有批量查询函数，读取时回退到逐笔查询
+                self.has_batch_view = any(item.get('name') == 'getTransfersBatch' for item in self.contract_abi)
+                self.has_status_counts = any(item.get('name') == 'getStatusCounts' for item in self.contract_abi)
+                # 只读查询优先使用链上事件的本地镜像（由 chain_indexer 维护），CHAIN_MIRROR=0 时总是直接查询节点
+                self.mirror = ChainMirror(self.contract_address) if os.getenv('CHAIN_MIRROR', '1') != '0' else None
+                # 镜像落后索引线程看到的链头不超过该区块数时才使用（索引线程只同步到扣除确认数的区块）
+                self.mirror_max_lag = int(os.getenv('CHAIN_MIRROR_MAX_LAG', os.getenv('INDEXER_CONFIRMATIONS', 0)))
+                # 索引线程超过该秒数没有心跳时视为已停止，读取回到节点
+                self.mirror_max_age = float(os.getenv('CHAIN_MIRROR_MAX_AGE', 30))
         except FileNotFoundError:
             print("合约未部署，请先运行 deploy_contract.py")
             self.contract = None
+            self.has_batch_view = False
+            self.has_status_counts = False
+            self.mirror = None
 
     def _ensure_checksum_address(self, address):
         """确保地址使用正确的EIP-55校验和格式，兼容不同版本的Web3.py"""
@@ -68,10 +164,64 @@ class BlockchainService:
             print(f"签名交易对象属性: {dir(signed_txn)}")
             raise
 
+    def _submit_transaction(self, contract_function, sender: str, private_key: str):
+        """估算gas、分配nonce、签名并发送交易，不等待回执，返回交易哈希"""
+        gas_estimate = contract_function.estimate_gas({'from': sender})
+        gas_price = self.w3.eth.gas_price
+
+        with self.nonce_manager.reserve(sender) as nonce:
+            transaction = contract_function.build_transaction({
+                'chainId': self.chain_id,
+                'gas': gas_estimate + 50000,
+                'gasPrice': gas_price,
+                'from': sender,
+                'nonce': nonce,
+            })
+            signed_txn = self.w3.eth.account.sign_transaction(transaction, private_key=private_key)
+            return self._send_raw_transaction(signed_txn)
+
+    def transfer_id_from_receipt(self, tx_receipt):
+        """从回执中的 TransferProposed 事件取出链上转会ID，没有该事件时返回 None"""
+        for log in tx_receipt['logs']:
+            topics = log['topics']
+            if (len(topics) > 1 and log['address'].lower() == self.contract_address.lower()
+                    and EVENT_TOPICS.get(_hex(topics[0])) == 'TransferProposed'):
+                return int(_hex(topics[1]), 16)
+        return None
+
+    def wait_for_transaction(self, tx_hash, timeout: int = 60, sender: str = None) -> Dict:
+        """阻塞等待交易回执；不希望阻塞调用线程时使用 ReceiptTracker
+
+        等待失败时交易可能已被节点丢弃，给出 sender 时重新同步该账户的nonce。
+        """
+        try:
+            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        except Exception as e:
+            print(f"等待交易回执错误: {e}")
+            if sender:
+                self.nonce_manager.resync(sender)
+            return {'success': False, 'tx_hash': _hex(tx_hash), 'error': str(e)}
+        return self.receipt_result(tx_hash, tx_receipt)
+
+    def receipt_result(self, tx_hash, tx_receipt) -> Dict:
+        """把交易回执转换为结果字典（回执为普通 dict，可 JSON 编码）；提议交易的结果中包含从事件解析出的 transfer_id"""
+        if tx_receipt.status != 1:
+            return {
+                'success': False,
+                'tx_hash': _hex(tx_hash),
+                'error': f'Transaction failed with status: {tx_receipt.status}'
+            }
+
+        result = {'success': True, 'tx_hash': _hex(tx_hash), 'tx_receipt': _plain(tx_receipt)}
+        transfer_id = self.transfer_id_from_receipt(tx_receipt)
+        if transfer_id is not None:
+            result['transfer_id'] = transfer_id
+        return result
+
     def _get_club_credentials(self, club_id):
         """从数据库获取俱乐部的钱包地址和私钥"""
         try:
-            conn = sqlite3.connect('football_transfer_enhanced.db')
+            conn = get_pool(DatabaseConfig.DB_PATH).acquire()
             cursor = conn.cursor()
 
             result = cursor.execute("""
@@ -97,6 +247,18 @@ class BlockchainService:
             print(f"获取俱乐部凭据失败: {e}")
             return None
 
+    def _use_mirror(self, live: bool) -> bool:
+        """未要求实时读取且本地镜像可用时从镜像读取
+
+        只检查索引线程写入的心跳和链头，不访问节点；索引线程未运行或已停止时心跳过期，读取自动回到节点。
+        """
+        if live or self.mirror is None:
+            return False
+        try:
+            return self.mirror.is_fresh(self.mirror_max_lag, self.mirror_max_age)
+        except Exception:
+            return False
+
     def is_connected(self):
         """检查区块链连接状态"""
         return self.w3.is_connected()
@@ -112,8 +274,8 @@ class BlockchainService:
         return self.w3.eth.get_balance(address)
 
     def propose_transfer(self, selling_club_id: str, buying_club_id: str, player_id: int,
-                         transfer_fee: int, income_hash: str):
-        """步骤1：卖方发起转会提议 - 使用卖方俱乐部的账户"""
+                         transfer_fee: int, income_hash: str, wait: bool = True):
+        """步骤1：卖方发起转会提议 - 使用卖方俱乐部的账户；wait=False 时发送后立即返回交易哈希"""
         if not self.contract:
             return {'success': False, 'error': 'Contract not available'}
 
@@ -149,48 +311,25 @@ class BlockchainService:
             if balance == 0:
                 return {'success': False, 'error': f'Selling club has insufficient ETH balance'}
 
-            # 估算gas
-            gas_estimate = self.contract.functions.proposeTransfer(
+            # 使用卖方俱乐部的私钥签名并发送
+            tx_hash = self._submit_transaction(self.contract.functions.proposeTransfer(
                 buying_club['address'],
                 player_id,
                 transfer_fee,
                 income_hash
-            ).estimate_gas({'from': selling_club['address']})
+            ), selling_club['address'], selling_club['private_key'])
 
-            nonce = self.w3.eth.get_transaction_count(selling_club['address'])
+            if not wait:
+                return {'success': True, 'pending': True, 'tx_hash': _hex(tx_hash),
+                        'sender': selling_club['address']}
 
-            transaction = self.contract.functions.proposeTransfer(
-                buying_club['address'],
-                player_id,
-                transfer_fee,
-                income_hash
-            ).build_transaction({
-                'chainId': self.chain_id,
-                'gas': gas_estimate + 50000,
-                'gasPrice': self.w3.eth.gas_price,
-                'from': selling_club['address'],
-                'nonce': nonce,
-            })
-
-            # 使用卖方俱乐部的私钥签名
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, private_key=selling_club['private_key'])
-            tx_hash = self._send_raw_transaction(signed_txn)
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=60)
-
-            if tx_receipt.status == 1:
+            # 转会ID取自回执中的 TransferProposed 事件，同一账户连续提交时也不会取错
+            result = self.wait_for_transaction(tx_hash, timeout=60, sender=selling_club['address'])
+            if result['success']:
                 print("✅ 卖方转会提议已成功提交")
-                current_transfer_count = self.get_transfer_count()
-                return {
-                    'success': True,
-                    'tx_hash': tx_hash.hex(),
-                    'tx_receipt': tx_receipt,
-                    'transfer_id': current_transfer_count
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Transaction failed with status: {tx_receipt.status}'
-                }
+                if 'transfer_id' not in result:
+                    result['transfer_id'] = self.get_transfer_count(live=True)
+            return result
 
         except Exception as e:
             print(f"区块链发起转会提议错误: {e}")
@@ -199,8 +338,8 @@ class BlockchainService:
                 'error': str(e)
             }
 
-    def accept_transfer(self, transfer_id: int, buying_club_id: str, expense_hash: str):
-        """步骤2：买方接受转会提议 - 使用买方俱乐部的账户"""
+    def accept_transfer(self, transfer_id: int, buying_club_id: str, expense_hash: str, wait: bool = True):
+        """步骤2：买方接受转会提议 - 使用买方俱乐部的账户；wait=False 时发送后立即返回交易哈希"""
         if not self.contract:
             return {'success': False, 'error': 'Contract not available'}
 
@@ -227,42 +366,20 @@ class BlockchainService:
             if balance == 0:
                 return {'success': False, 'error': f'Buying club has insufficient ETH balance'}
 
-            # 估算gas
-            gas_estimate = self.contract.functions.acceptTransfer(
+            # 使用买方俱乐部的私钥签名并发送
+            tx_hash = self._submit_transaction(self.contract.functions.acceptTransfer(
                 transfer_id,
                 expense_hash
-            ).estimate_gas({'from': buying_club['address']})
+            ), buying_club['address'], buying_club['private_key'])
 
-            nonce = self.w3.eth.get_transaction_count(buying_club['address'])
+            if not wait:
+                return {'success': True, 'pending': True, 'tx_hash': _hex(tx_hash),
+                        'sender': buying_club['address']}
 
-            transaction = self.contract.functions.acceptTransfer(
-                transfer_id,
-                expense_hash
-            ).build_transaction({
-                'chainId': self.chain_id,
-                'gas': gas_estimate + 50000,
-                'gasPrice': self.w3.eth.gas_price,
-                'from': buying_club['address'],
-                'nonce': nonce,
-            })
-
-            # 使用买方俱乐部的私钥签名
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, private_key=buying_club['private_key'])
-            tx_hash = self._send_raw_transaction(signed_txn)
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=60)
-
-            if tx_receipt.status == 1:
+            result = self.wait_for_transaction(tx_hash, timeout=60, sender=buying_club['address'])
+            if result['success']:
                 print("✅ 买方转会接受已成功确认")
-                return {
-                    'success': True,
-                    'tx_hash': tx_hash.hex(),
-                    'tx_receipt': tx_receipt
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Transaction failed with status: {tx_receipt.status}'
-                }
+            return result
 
         except Exception as e:
             print(f"区块链接受转会错误: {e}")
@@ -271,8 +388,8 @@ class BlockchainService:
                 'error': str(e)
             }
 
-    def validate_transfer(self, transfer_id: int, is_legitimate: bool):
-        """步骤3：监管方验证转会 - 使用管理员账户"""
+    def validate_transfer(self, transfer_id: int, is_legitimate: bool, wait: bool = True):
+        """步骤3：监管方验证转会 - 使用管理员账户；wait=False 时发送后立即返回交易哈希"""
         if not self.contract:
             return {'success': False, 'error': 'Contract not available'}
 
@@ -281,9 +398,10 @@ class BlockchainService:
             print(f"  转会ID: {transfer_id}")
             print(f"  验证结果: {'合法' if is_legitimate else '违法'}")
 
-            # 检查是否为合约owner
-            owner = self.contract.functions.owner().call()
-            owner = self._ensure_checksum_address(owner)
+            # 检查是否为合约owner（owner 部署后不变，只查询一次）
+            if self._owner is None:
+                self._owner = self._ensure_checksum_address(self.contract.functions.owner().call())
+            owner = self._owner
 
             if owner.lower() != self.admin_address.lower():
                 return {'success': False,
@@ -297,43 +415,21 @@ class BlockchainService:
             except Exception as e:
                 return {'success': False, 'error': f'Invalid transfer ID or transfer not found: {e}'}
 
-            # 估算gas
-            gas_estimate = self.contract.functions.validateTransfer(
+            tx_hash = self._submit_transaction(self.contract.functions.validateTransfer(
                 transfer_id,
                 is_legitimate
-            ).estimate_gas({'from': self.admin_address})
+            ), self.admin_address, self.admin_private_key)
 
-            nonce = self.w3.eth.get_transaction_count(self.admin_address)
+            if not wait:
+                return {'success': True, 'pending': True, 'tx_hash': _hex(tx_hash), 'is_completed': is_legitimate,
+                        'sender': self.admin_address}
 
-            transaction = self.contract.functions.validateTransfer(
-                transfer_id,
-                is_legitimate
-            ).build_transaction({
-                'chainId': self.chain_id,
-                'gas': gas_estimate + 50000,
-                'gasPrice': self.w3.eth.gas_price,
-                'from': self.admin_address,
-                'nonce': nonce,
-            })
-
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, private_key=self.admin_private_key)
-            tx_hash = self._send_raw_transaction(signed_txn)
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
-
-            if tx_receipt.status == 1:
+            result = self.wait_for_transaction(tx_hash, timeout=30, sender=self.admin_address)
+            if result['success']:
                 status_text = "完成" if is_legitimate else "拒绝"
                 print(f"✅ 监管方验证完成，转会已被{status_text}")
-                return {
-                    'success': True,
-                    'tx_hash': tx_hash.hex(),
-                    'tx_receipt': tx_receipt,
-                    'is_completed': is_legitimate
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Transaction failed with status: {tx_receipt.status}'
-                }
+                result['is_completed'] = is_legitimate
+            return result
 
         except Exception as e:
             print(f"区块链验证转会错误: {e}")
@@ -342,33 +438,192 @@ class BlockchainService:
                 'error': str(e)
             }
 
-    def get_transfer_details(self, transfer_id: int):
+    def submit_transfer_protocol(self, selling_club_id: str, buying_club_id: str, player_id: int,
+                                 transfer_fee: int, income_hash: str, expense_hash: str,
+                                 on_update: Callable[[str, Dict], None] = None) -> Future:
+        """异步执行三步确认流程，立即返回 Future，不阻塞调用线程
+
+        每步交易发送后登记到回执跟踪器，回执确认后在跟踪器的回调线程池中提交下一步。
+        on_update(阶段, 结果) 在阶段变化时调用，阶段为 proposed、accepted、confirmed 或 failed；
+        Future 的结果包含 propose/accept/validate 各步结果、success 和 blockchain_transfer_id。
+        """
+        tracker = get_receipt_tracker(self)
+        outcome = Future()
+        results = {}
+
+        def report(stage, result):
+            if on_update is not None:
+                try:
+                    on_update(stage, result)
+                except Exception as e:
+                    print(f"转会流程进度回调错误: {e}")
+
+        def fail(step, result):
+            results['success'] = False
+            results['error'] = f"{step} failed: {result.get('error', 'Unknown error')}"
+            report('failed', result)
+            outcome.set_result(results)
+
+        def submitted(step, submission, on_confirmed):
+            """发送成功则登记回执跟踪，确认后继续下一步"""
+            if not submission['success']:
+                fail(step, submission)
+                return
+
+            def confirmed(result):
+                if not result['success']:
+                    fail(step, result)
+                    return
+                results[step.lower()] = result
+                try:
+                    on_confirmed(result)
+                except Exception as e:
+                    print(f"转会流程 {step} 之后的步骤出错: {e}")
+                    fail(step, {'error': str(e)})
+
+            tracker.track(submission['tx_hash'], confirmed, submission.get('sender'))
+
+        def proposed(result):
+            if 'transfer_id' not in result:
+                result['transfer_id'] = self.get_transfer_count(live=True)
+            results['blockchain_transfer_id'] = result['transfer_id']
+            report('proposed', result)
+            submitted('Accept', self.accept_transfer(result['transfer_id'], buying_club_id, expense_hash,
+                                                     wait=False), accepted)
+
+        def accepted(result):
+            report('accepted', result)
+            submitted('Validate', self.validate_transfer(results['blockchain_transfer_id'], True, wait=False),
+                      validated)
+
+        def validated(result):
+            results['success'] = True
+            report('confirmed', result)
+            outcome.set_result(results)
+
+        submitted('Propose', self.propose_transfer(selling_club_id, buying_club_id, player_id, transfer_fee,
+                                                   income_hash, wait=False), proposed)
+        return outcome
+
+    def validate_transfers(self, validations: List[Tuple[int, bool]], timeout: int = 60) -> List[Dict]:
+        """监管方批量验证：先连续提交全部验证交易，再统一等待回执，结果与输入顺序一致"""
+        submitted = [self.validate_transfer(transfer_id, is_legitimate, wait=False)
+                     for transfer_id, is_legitimate in validations]
+
+        results = []
+        for (transfer_id, is_legitimate), submission in zip(validations, submitted):
+            if not submission['success']:
+                results.append(submission)
+                continue
+            result = self.wait_for_transaction(submission['tx_hash'], timeout=timeout,
+                                               sender=submission.get('sender'))
+            if result['success']:
+                result['is_completed'] = is_legitimate
+            results.append(result)
+        return results
+
+    def get_transfer_details(self, transfer_id: int, live: bool = False):
         """获取转会详细信息"""
         if not self.contract:
             return None
 
         try:
-            transfer = self.contract.functions.getTransferDetails(transfer_id).call()
-            status_names = ["Proposed", "Accepted", "Validated", "Completed", "Rejected"]
+            if self._use_mirror(live):
+                transfers = self.mirror.get_transfers(transfer_id, transfer_id)
+                return self._format_transfer_details(*transfers[0]) if transfers else None
 
-            return {
-                'sellingClub': self._ensure_checksum_address(transfer[0]),
-                'buyingClub': self._ensure_checksum_address(transfer[1]),
-                'playerId': transfer[2],
-                'transferFee': transfer[3],
-                'status': status_names[transfer[4]] if transfer[4] < len(status_names) else "Unknown",
-                'statusCode': transfer[4],
-                'proposalTimestamp': transfer[5],
-                'acceptanceTimestamp': transfer[6],
-                'validationTimestamp': transfer[7],
-                'isLegitimate': transfer[8],
-                'lshIncomeHash': transfer[9],
-                'lshExpenseHash': transfer[10]
-            }
+            transfer = self.contract.functions.getTransferDetails(transfer_id).call()
+            return self._format_transfer_details(transfer_id, transfer)
         except Exception as e:
             print(f"获取转会详细信息错误: {e}")
             return None
 
+    def _format_transfer_details(self, transfer_id: int, transfer):
+        """把 getTransferDetails 的返回值转换为字典"""
+        status_code = transfer[4]
+        return {
+            'transferId': transfer_id,
+            'sellingClub': self._ensure_checksum_address(transfer[0]),
+            'buyingClub': self._ensure_checksum_address(transfer[1]),
+            'playerId': transfer[2],
+            'transferFee': transfer[3],
+            'status': self.STATUS_NAMES[status_code] if status_code < len(self.STATUS_NAMES) else "Unknown",
+            'statusCode': status_code,
+            'proposalTimestamp': transfer[5],
+            'acceptanceTimestamp': transfer[6],
+            'validationTimestamp': transfer[7],
+            'isLegitimate': transfer[8],
+            'lshIncomeHash': transfer[9],
+            'lshExpenseHash': transfer[10]
+        }
+
+    def _format_transfer_struct(self, transfer_id: int, transfer):
+        """把 getTransfersBatch 返回的 Transfer 结构体转换为与 get_transfer_details 相同的字典"""
+        (selling_club, buying_club, player_id, transfer_fee, proposal_time, acceptance_time,
+         validation_time, status, income_hash, expense_hash, is_legitimate) = transfer
+        return self._format_transfer_details(transfer_id, (
+            selling_club, buying_club, player_id, transfer_fee, status, proposal_time,
+            acceptance_time, validation_time, is_legitimate, income_hash, expense_hash))
+
+    def _fetch_transfer_segment(self, start_id: int, count: int):
+        """一次往返读取一段连续的转会：优先使用合约批量查询，其次JSON-RPC批量请求"""
+        if self.has_batch_view:
+            transfers = self.contract.functions.getTransfersBatch(start_id, count).call()
+            return [self._format_transfer_struct(start_id + offset, transfer)
+                    for offset, transfer in enumerate(transfers)]
+
+        if hasattr(self.w3, 'batch_requests'):
+            with self.w3.batch_requests() as batch:
+                for transfer_id in range(start_id, start_id + count):
+                    batch.add(self.contract.functions.getTransferDetails(transfer_id))
+                transfers = batch.execute()
+            return [self._format_transfer_details(start_id + offset, transfer)
+                    for offset, transfer in enumerate(transfers)]
+
+        return None
+
+    def get_transfer_details_batch(self, start_id: int, end_id: int, live: bool = False, strict: bool = False):
+        """批量获取 start_id 到 end_id（含）的转会详情，每 batch_size 笔一次RPC
+
+        合约没有批量查询函数且节点不支持批量请求时逐笔查询，结果与逐次调用 get_transfer_details 相同。
+        默认跳过读取失败的转会；strict 为 True 时读取失败直接抛出异常（索引同步使用，避免漏记）。
+        """
+        if not self.contract:
+            return []
+
+        start_id = max(1, start_id)
+        if self._use_mirror(live):
+            return [self._format_transfer_details(transfer_id, transfer)
+                    for transfer_id, transfer in self.mirror.get_transfers(start_id, end_id)]
+
+        results = []
+        for segment_start in range(start_id, end_id + 1, self.batch_size):
+            count = min(self.batch_size, end_id - segment_start + 1)
+            try:
+                segment = self._fetch_transfer_segment(segment_start, count)
+            except Exception as e:
+                print(f"批量获取转会详情错误，改为逐笔查询: {e}")
+                segment = None
+
+            if segment is None and strict:
+                segment = [self._format_transfer_details(
+                    transfer_id, self.contract.functions.getTransferDetails(transfer_id).call())
+                    for transfer_id in range(segment_start, segment_start + count)]
+            elif segment is None:
+                segment = [details for details in (self.get_transfer_details(transfer_id, live=True)
+                                                   for transfer_id in range(segment_start, segment_start + count))
+                           if details]
+            results.extend(segment)
+
+        return results
+
+    def get_recent_transfers(self, count: int = 5):
+        """获取最近的若干笔转会详情（按转会ID升序）"""
+        total_transfers = self.get_transfer_count()
+        if total_transfers <= 0:
+            return []
+        return self.get_transfer_details_batch(max(1, total_transfers - count + 1), total_transfers)
+
     def get_transfer(self, transfer_id: int):
         """获取转会信息（保持向后兼容）"""
         details = self.get_transfer_details(transfer_id)
@@ -386,7 +641,7 @@ class BlockchainService:
             }
         return None
 
-    def get_club(self, club_address: str):
+    def get_club(self, club_address: str, live: bool = False):
         """获取俱乐部信息"""
         if not self.contract:
             return None
@@ -396,6 +651,9 @@ class BlockchainService:
             return None
 
         try:
+            if self._use_mirror(live):
+                return self.mirror.get_club(club_address) or {'name': '', 'country': '', 'isRegistered': False}
+
             club = self.contract.functions.getClub(club_address).call()
             return {
                 'name': club[0],
@@ -406,18 +664,20 @@ class BlockchainService:
             print(f"获取俱乐部信息错误: {e}")
             return None
 
-    def get_transfer_count(self):
+    def get_transfer_count(self, live: bool = False):
         """获取转会总数"""
         if not self.contract:
             return 0
 
         try:
+            if self._use_mirror(live):
+                return self.mirror.get_transfer_count()
             return self.contract.functions.transferCount().call()
         except Exception as e:
             print(f"获取转会总数错误: {e}")
             return 0
 
-    def is_club_registered(self, club_address: str):
+    def is_club_registered(self, club_address: str, live: bool = False):
         """检查俱乐部是否已注册"""
         if not self.contract:
             return False
@@ -427,6 +687,8 @@ class BlockchainService:
             return False
 
         try:
+            if self._use_mirror(live):
+                return self.mirror.get_club(club_address) is not None
             return self.contract.functions.isClubRegistered(club_address).call()
         except Exception as e:
             print(f"检查俱乐部注册状态错误: {e}")
@@ -435,7 +697,7 @@ class BlockchainService:
     def check_all_clubs_registered(self):
         """检查数据库中所有俱乐部是否都已在区块链上注册"""
         try:
-            conn = sqlite3.connect('football_transfer_enhanced.db')
+            conn = get_pool(DatabaseConfig.DB_PATH).acquire()
             cursor = conn.cursor()
 
             clubs = cursor.execute("SELECT club_id, name, wallet_address FROM clubs").fetchall()
@@ -443,9 +705,10 @@ class BlockchainService:
 
             unregistered_clubs = []
 
+            # 决定是否提交链上交易，必须读取链上最新状态
             for club_id, name, address in clubs:
                 address = self._ensure_checksum_address(address)
-                if not self.is_club_registered(address):
+                if not self.is_club_registered(address, live=True):
                     unregistered_clubs.append({'id': club_id, 'name': name, 'address': address})
 
             return {
@@ -469,13 +732,26 @@ class BlockchainService:
             return None
 
         try:
+            if self._use_mirror(False):
+                counts = self.mirror.get_status_counts()
+                return {
+                    'total_transfers': self.mirror.get_transfer_count(),
+                    'status_counts': {name: counts.get(code, 0) for code, name in enumerate(self.STATUS_NAMES)}
+                }
+
+            # 合约维护了各状态计数时一次调用即可，总数等于各状态之和
+            if self.has_status_counts:
+                counts = self.contract.functions.getStatusCounts().call()
+                return {
+                    'total_transfers': sum(counts),
+                    'status_counts': dict(zip(self.STATUS_NAMES, counts))
+                }
+
             total_transfers = self.get_transfer_count()
-            status_counts = {"Proposed": 0, "Accepted": 0, "Validated": 0, "Completed": 0, "Rejected": 0}
+            status_counts = {name: 0 for name in self.STATUS_NAMES}
 
-            for i in range(1, total_transfers + 1):
-                details = self.get_transfer_details(i)
-                if details:
-                    status_counts[details['status']] += 1
+            for details in self.get_transfer_details_batch(1, total_transfers):
+                status_counts[details['status']] = status_counts.get(details['status'], 0) + 1
 
             return {
                 'total_transfers': total_transfers,
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from web3 import Web3
+
+from config.database import DatabaseConfig, get_pool
+
+# 合约事件签名，topic0 为签名的 keccak256 哈希；所有事件的第一个 indexed 参数都在 topic1
+CHAIN_EVENTS = {
+    'ClubRegistered': 'ClubRegistered(address,string)',
+    'TransferProposed': 'TransferProposed(uint256,address,address,uint256,uint256)',
+    'TransferAccepted': 'TransferAccepted(uint256,address)',
+    'TransferValidated': 'TransferValidated(uint256,bool)',
+    'TransferCompleted': 'TransferCompleted(uint256)',
+    'TransferRejected': 'TransferRejected(uint256,string)',
+}
+
+
+def _hex(value) -> str:
+    """统一为带 0x 前缀的小写十六进制字符串（不同版本的 HexBytes.hex() 前缀不一致）"""
+    text = value.hex() if isinstance(value, (bytes, bytearray)) else str(value)
+    text = text.lower()
+    return text if text.startswith('0x') else f"0x{text}"
+
+
+EVENT_TOPICS = {_hex(Web3.keccak(text=signature)): name for name, signature in CHAIN_EVENTS.items()}
+
+
+class ChainMirror:
+    """链上数据本地镜像的只读访问，由 ChainIndexer 写入
+
+    镜像按合约地址区分；该合约还没有同步检查点时 is_ready() 为 False，调用方应直接读取链上数据。
+    检查点同时记录索引线程最近看到的链头和心跳时间，is_fresh() 只读本地数据库，不访问节点。
+    """
+
+    def __init__(self, contract_address: str, db_path: str = None):
+        self.contract_address = contract_address
+        self.db_path = db_path or DatabaseConfig.DB_PATH
+
+    def get_connection(self):
+        return get_pool(self.db_path).acquire()
+
+    def last_block(self) -> Optional[int]:
+        """已同步到的区块号，没有检查点（或镜像表不存在）时返回 None"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT last_block FROM chain_checkpoints WHERE contract_address = ?",
+                               (self.contract_address,)).fetchone()
+            return row['last_block'] if row else None
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+    def is_ready(self) -> bool:
+        return self.last_block() is not None
+
+    def is_fresh(self, max_lag: int = 0, max_age: float = 30) -> bool:
+        """索引线程在 max_age 秒内有过心跳，且已同步区块距它看到的链头不超过 max_lag 个区块
+
+        索引线程停止后心跳过期，镜像不再被使用；追赶历史区块期间落后过多也不使用。
+        """
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT last_block, chain_head, heartbeat_at FROM chain_checkpoints WHERE contract_address = ?
+            """, (self.contract_address,)).fetchone()
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+
+        if row is None or row['chain_head'] is None or row['heartbeat_at'] is None:
+            return False
+        return (time.time() - row['heartbeat_at'] <= max_age
+                and row['chain_head'] - row['last_block'] <= max_lag)
+
+    def get_transfer_count(self) -> int:
+        """合约的 transferCount 即最大的转会ID"""
+        conn = self.get_connection()
+        try:
+            return conn.execute("""
+                SELECT COALESCE(MAX(transfer_id), 0) FROM chain_transfers WHERE contract_address = ?
+            """, (self.contract_address,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_transfers(self, start_id: int, end_id: int) -> List[Tuple[int, tuple]]:
+        """返回 [(转会ID, 与 getTransferDetails 返回值顺序相同的元组)]，按ID升序"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT transfer_id, selling_club, buying_club, player_id, transfer_fee, status_code,
+                       proposal_timestamp, acceptance_timestamp, validation_timestamp, is_legitimate,
+                       lsh_income_hash, lsh_expense_hash
+                FROM chain_transfers
+                WHERE contract_address = ? AND transfer_id BETWEEN ? AND ?
+                ORDER BY transfer_id
+            """, (self.contract_address, start_id, end_id)).fetchall()
+        finally:
+            conn.close()
+
+        return [(row['transfer_id'], (
+            row['selling_club'], row['buying_club'], int(row['player_id']), int(row['transfer_fee']),
+            row['status_code'], row['proposal_timestamp'], row['acceptance_timestamp'],
+            row['validation_timestamp'], bool(row['is_legitimate']), row['lsh_income_hash'],
+            row['lsh_expense_hash'])) for row in rows]
+
+    def get_status_counts(self) -> Dict[int, int]:
+        """各状态码的转会数量"""
+        conn = self.get_connection()
+        try:
+            return {row['status_code']: row['count'] for row in conn.execute("""
+                SELECT status_code, COUNT(*) AS count FROM chain_transfers
+                WHERE contract_address = ?
+                GROUP BY status_code
+            """, (self.contract_address,))}
+        finally:
+            conn.close()
+
+    def get_club(self, address: str) -> Optional[Dict]:
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT name, country FROM chain_clubs WHERE contract_address = ? AND address = ?
+            """, (self.contract_address, address)).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+        return {'name': row['name'], 'country': row['country'], 'isRegistered': True}
+
+
+class ChainIndexer:
+    """后台同步合约事件到本地镜像
+
+    按区块范围调用 eth_getLogs，按 topic 识别事件并取出涉及的转会ID和俱乐部地址，
+    再从合约批量读取这些记录的最新状态写入镜像；每个区块范围与检查点在同一事务中提交，
+    中断后从检查点继续。节点拒绝过大的范围时自动减半重试。
+    """
+
+    def __init__(self, blockchain_service, db_path: str = None, block_range: int = None,
+                 poll_interval: float = None, confirmations: int = None, start_block: int = None):
+        self.blockchain_service = blockchain_service
+        self.w3 = blockchain_service.w3
+        self.contract_address = blockchain_service.contract_address
+        self.mirror = ChainMirror(self.contract_address, db_path)
+        self.block_range = int(block_range or os.getenv('INDEXER_BLOCK_RANGE', 2000))
+        self.poll_interval = float(poll_interval or os.getenv('INDEXER_POLL_INTERVAL', 2))
+        # 只同步已有足够确认数的区块（Ganache 不会重组，默认为0）
+        self.confirmations = int(confirmations if confirmations is not None
+                                 else os.getenv('INDEXER_CONFIRMATIONS', 0))
+        self.start_block = int(start_block if start_block is not None
+                               else os.getenv('INDEXER_START_BLOCK', blockchain_service.deployment_block))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_connection(self):
+        return self.mirror.get_connection()
+
+    def _get_logs(self, from_block: int, to_block: int) -> List:
+        return self.w3.eth.get_logs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': self.contract_address,
+            'topics': [list(EVENT_TOPICS)]
+        })
+
+    def _decode_logs(self, logs: List) -> Tuple[Set[int], Dict[str, int]]:
+        """返回 (涉及的转会ID, {注册的俱乐部地址: 注册区块})"""
+        transfer_ids = set()
+        clubs = {}
+        for log in logs:
+            topics = log['topics']
+            event = EVENT_TOPICS.get(_hex(topics[0])) if topics else None
+            if event is None or len(topics) < 2:
+                continue
+            if event == 'ClubRegistered':
+                address = self.blockchain_service._ensure_checksum_address(f"0x{_hex(topics[1])[-40:]}")
+                clubs[address] = log['blockNumber']
+            else:
+                transfer_ids.add(int(_hex(topics[1]), 16))
+        return transfer_ids, clubs
+
+    def _fetch_transfers(self, transfer_ids: Set[int]) -> List[Dict]:
+        """按连续ID分段批量读取转会的最新状态；任何一笔读取失败都抛出异常，该区块范围不提交"""
+        details = []
+        ordered = sorted(transfer_ids)
+        run_start = previous = None
+        for transfer_id in ordered + [None]:
+            if transfer_id is not None and previous is not None and transfer_id == previous + 1:
+                previous = transfer_id
+                continue
+            if run_start is not None:
+                details.extend(self.blockchain_service.get_transfer_details_batch(
+                    run_start, previous, live=True, strict=True))
+            run_start = previous = transfer_id
+
+        missing = transfer_ids - {item['transferId'] for item in details}
+        if missing:
+            raise RuntimeError(f"未能读取转会 {sorted(missing)}")
+        return details
+
+    def _fetch_clubs(self, clubs: Dict[str, int]) -> List[Tuple]:
+        """读取新注册俱乐部的信息，读取失败时抛出异常"""
+        club_rows = []
+        for address, block_number in clubs.items():
+            club = self.blockchain_service.get_club(address, live=True)
+            if club is None:
+                raise RuntimeError(f"未能读取俱乐部 {address}")
+            club_rows.append((self.contract_address, address, club['name'], club['country'], block_number))
+        return club_rows
+
+    def _write_range(self, to_block: int, chain_head: int, transfers: List[Dict], club_rows: List[Tuple]):
+        """一个区块范围的镜像更新和检查点在同一事务中提交；链上数据需在事务外读好，避免持锁等待节点"""
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("""
+                INSERT OR REPLACE INTO chain_transfers
+                (contract_address, transfer_id, selling_club, buying_club, player_id, transfer_fee,
+                 status_code, proposal_timestamp, acceptance_timestamp, validation_timestamp,
+                 is_legitimate, lsh_income_hash, lsh_expense_hash, updated_block)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(self.contract_address, details['transferId'], details['sellingClub'], details['buyingClub'],
+                   str(details['playerId']), str(details['transferFee']), details['statusCode'],
+                   details['proposalTimestamp'], details['acceptanceTimestamp'],
+                   details['validationTimestamp'], 1 if details['isLegitimate'] else 0,
+                   details['lshIncomeHash'], details['lshExpenseHash'], to_block) for details in transfers])
+
+            conn.executemany("""
+                INSERT OR REPLACE INTO chain_clubs
+                (contract_address, address, name, country, registered_block)
+                VALUES (?, ?, ?, ?, ?)
+            """, club_rows)
+
+            conn.execute("""
+                INSERT OR REPLACE INTO chain_checkpoints
+                (contract_address, last_block, chain_head, heartbeat_at, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (self.contract_address, to_block, chain_head, time.time()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _heartbeat(self, chain_head: int):
+        """没有新区块可同步时只刷新链头和心跳时间"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                UPDATE chain_checkpoints SET chain_head = ?, heartbeat_at = ? WHERE contract_address = ?
+            """, (chain_head, time.time(), self.contract_address))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def sync_once(self) -> int:
+        """同步到当前最新（扣除确认数）的区块，返回本次处理的区块数"""
+        chain_head = self.w3.eth.block_number
+        latest = chain_head - self.confirmations
+        last_block = self.mirror.last_block()
+        from_block = self.start_block if last_block is None else last_block + 1
+        processed = 0
+
+        while from_block <= latest and not self._stop.is_set():
+            to_block = min(from_block + self.block_range - 1, latest)
+            try:
+                logs = self._get_logs(from_block, to_block)
+            except Exception as e:
+                if to_block == from_block:
+                    raise
+                self.block_range = max(1, self.block_range // 2)
+                print(f"获取区块 {from_block}-{to_block} 日志失败，范围减半为 {self.block_range}: {e}")
+                continue
+
+            transfer_ids, clubs = self._decode_logs(logs)
+            self._write_range(to_block, chain_head, self._fetch_transfers(transfer_ids), self._fetch_clubs(clubs))
+            processed += to_block - from_block + 1
+            from_block = to_block + 1
+
+        if not processed:
+            self._heartbeat(chain_head)
+        return processed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.sync_once()
+                if processed:
+                    print(f"链上索引已同步 {processed} 个区块，当前区块 {self.mirror.last_block()}")
+            except Exception as e:
+                print(f"链上索引同步错误: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """启动后台同步线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chain-indexer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def main():
+    from services.blockchain_service import BlockchainService
+
+    parser = argparse.ArgumentParser(description='同步合约事件到本地镜像')
+    parser.add_argument('--once', action='store_true', help='同步到最新区块后退出')
+    parser.add_argument('--block-range', type=int, default=None, help='每次 eth_getLogs 的区块数')
+    args = parser.parse_args()
+
+    blockchain_service = BlockchainService()
+    if not blockchain_service.contract:
+        return
+
+    indexer = ChainIndexer(blockchain_service, block_range=args.block_range)
+    if args.once:
+        print(f"已同步 {indexer.sync_once()} 个区块，当前区块 {indexer.mirror.last_block()}")
+        return
+
+    indexer.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        indexer.stop()
+
+
+if __name__ == "__main__":
+    main()
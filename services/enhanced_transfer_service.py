@@ -4,8 +4,11 @@ import json
 import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+from config.database import get_pool, fetch_named_page, iter_rows, named_query
 from services.lsh_service import LSHService
+from services.rescreen_service import BulkRescreenService
 from services.blockchain_service import BlockchainService
+from services.receipt_tracker import transfer_status_updater
 import os
 db_path = 'football_transfer_enhanced.db'
 print(f"[DEBUG] 数据库路径: {os.path.abspath(db_path)}")
@@ -16,6 +19,7 @@ class EnhancedTransferService:
     def __init__(self, db_path='football_transfer_enhanced.db'):
         self.db_path = db_path
         self.lsh_service = LSHService()
+        self._lsh_buckets_loaded = False
         try:
             self.blockchain_service = BlockchainService()
         except Exception as e:
@@ -23,24 +27,9 @@ class EnhancedTransferService:
             self.blockchain_service = None
 
     def get_connection(self):
-        # """获取数据库连接"""
-        # conn = sqlite3.connect(self.db_path)
-        # conn.row_factory = sqlite3.Row
-        # return conn
-        """获取数据库连接"""
+        """获取数据库连接（来自共享连接池）"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            # 检验是否连接成功
-            print("数据库连接成功")
-
-            # 打印一些示例数据，观察是否连接成功
-            cursor = conn.cursor()
-            cursor.execute("SELECT sqlite_version();")
-            data = cursor.fetchone()
-            print(f"SQLite 版本: {data[0]}")
-
-            conn.row_factory = sqlite3.Row
-            return conn
+            return get_pool(self.db_path).acquire()
         except sqlite3.Error as e:
             print(f"数据库连接失败: {e}")
             return None
@@ -247,7 +236,7 @@ class EnhancedTransferService:
             # 创建通知
             self._create_notification(
                 receiving_club_id, 'offer_received', '收到转会报价',
-                f'收到对球员的转会报价 €{offer_amount:,.2f}', offer_id
+                f'收到对球员的转会报价 €{offer_amount:,.2f}', offer_id, conn=conn
             )
 
             conn.commit()
@@ -294,7 +283,7 @@ class EnhancedTransferService:
             self._create_notification(
                 offer['offering_club_id'], message_type,
                 f"报价被{'接受' if accept else '拒绝'}",
-                notification_message, offer_id
+                notification_message, offer_id, conn=conn
             )
 
             conn.commit()
@@ -311,9 +300,15 @@ class EnhancedTransferService:
             return {'success': False, 'error': str(e)}
 
     def process_complete_transfer(self, offer_id: str, income_data: Dict, expense_data: Dict):
-        """处理完整的转会交易"""
+        """处理完整的转会交易
+
+        历史读取、LSH验证、转会/验证记录写入、球员与俱乐部更新和通知在同一连接的
+        一个 BEGIN IMMEDIATE 事务中完成；区块链操作在提交后进行，不占用数据库写锁。
+        """
+        conn = None
         try:
             conn = self.get_connection()
+            conn.execute("BEGIN IMMEDIATE")
 
             # 获取报价信息
             offer = conn.execute("""
@@ -328,26 +323,26 @@ class EnhancedTransferService:
             """, (offer_id,)).fetchone()
 
             if not offer:
+                conn.rollback()
                 return {
                     'success': False,
                     'error': 'Accepted offer not found'
                 }
 
-            # 获取俱乐部转会历史进行LSH验证
-            selling_history = self._get_club_transfer_history(offer['receiving_club_id'], 'selling')
-            buying_history = self._get_club_transfer_history(offer['offering_club_id'], 'buying')
+            selling_club_id = offer['receiving_club_id']
+            buying_club_id = offer['offering_club_id']
 
-            # 准备LSH验证数据
-            selling_data = self._prepare_lsh_data(selling_history, 'selling')
-            buying_data = self._prepare_lsh_data(buying_history, 'buying')
+            # 增量投影状态不存在或与数据库水位不一致（其他进程/管理器写入了转会）时从转会历史重新初始化，
+            # 否则只做 O(位宽) 的更新；检查在写事务内进行，期间没有其他写入
+            self._ensure_club_lsh_state(selling_club_id, 'selling', conn)
+            self._ensure_club_lsh_state(buying_club_id, 'buying', conn)
 
-            # 添加当前转会数据
+            # 当前转会数据
             current_selling_data = {
                 'transfer_fee': income_data['transfer_fee'],
                 'player_market_value': offer['market_value'],
                 'additional_costs': income_data.get('agent_commission', 0)
             }
-            selling_data.append(current_selling_data)
 
             current_buying_data = {
                 'transfer_fee': expense_data['transfer_fee'],
@@ -355,12 +350,13 @@ class EnhancedTransferService:
                 'additional_costs': expense_data.get('total_expense', expense_data['transfer_fee']) - expense_data[
                     'transfer_fee']
             }
-            buying_data.append(current_buying_data)
 
             # 进行LSH验证
-            validation_result = self.lsh_service.validate_transfer(selling_data, buying_data)
+            validation_result = self.lsh_service.validate_transfer_incremental(
+                selling_club_id, buying_club_id, current_selling_data, current_buying_data)
 
             if not validation_result['is_legitimate']:
+                conn.rollback()
                 return {
                     'success': False,
                     'error': 'Transfer failed LSH validation - potential money laundering detected',
@@ -370,51 +366,35 @@ class EnhancedTransferService:
             # 创建转会记录
             transfer_id = f"transfer_{uuid.uuid4().hex[:8]}"
 
-            # 尝试区块链操作
-            blockchain_result = None
-            if self.blockchain_service and self.blockchain_service.is_connected():
-                try:
-                    blockchain_result = self.blockchain_service.propose_transfer(
-                        self._ensure_checksum_address(offer['buying_address']),
-                        int(offer['player_id'].replace('player_', ''), 16) % 1000000,
-                        int(offer['offer_amount']),
-                        validation_result['income_index'],
-                        validation_result['expense_index']
-                    )
-
-                    if blockchain_result and blockchain_result['success']:
-                        # 自动验证转会
-                        transfer_count = self.blockchain_service.get_transfer_count()
-                        validate_result = self.blockchain_service.validate_transfer(transfer_count, True)
-
-                except Exception as e:
-                    print(f"区块链操作失败: {e}")
-                    blockchain_result = {'success': False, 'error': str(e)}
-
-            # 保存转会记录
+            # 保存转会记录（同时保存打包后的紧凑签名），交易哈希在区块链操作完成后补写
+            income_signature = self.lsh_service.pack_index(validation_result['income_index'])
+            expense_signature = self.lsh_service.pack_index(validation_result['expense_index'])
             conn.execute("""
                 INSERT INTO transfers 
                 (transfer_id, player_id, selling_club_id, buying_club_id, transfer_fee,
-                 additional_costs, income_data, expense_data, lsh_income_hash, lsh_expense_hash,
+                 additional_costs, agent_commission, total_expense, income_data, expense_data,
+                 lsh_income_hash, lsh_expense_hash, lsh_income_signature, lsh_expense_signature,
                  is_validated, is_completed, transaction_hash, completed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (transfer_id, offer['player_id'], offer['receiving_club_id'],
                   offer['offering_club_id'], offer['offer_amount'],
                   expense_data.get('total_expense', 0) - expense_data['transfer_fee'],
+                  income_data.get('agent_commission'), expense_data.get('total_expense'),
                   json.dumps(income_data), json.dumps(expense_data),
                   validation_result['income_index'], validation_result['expense_index'],
-                  1, 1, blockchain_result.get('tx_hash') if blockchain_result else None,
-                  datetime.now().isoformat()))
+                  income_signature, expense_signature,
+                  1, 1, None, datetime.now().isoformat()))
 
             # 保存LSH验证记录
             validation_id = f"validation_{uuid.uuid4().hex[:8]}"
             conn.execute("""
                 INSERT INTO lsh_validations 
-                (validation_id, transfer_id, income_index, expense_index,
-                 similarity_score, is_legitimate, validation_details, risk_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (validation_id, transfer_id, income_index, expense_index, income_signature,
+                 expense_signature, similarity_score, is_legitimate, validation_details, risk_level)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (validation_id, transfer_id, validation_result['income_index'],
-                  validation_result['expense_index'], validation_result['similarity_score'],
+                  validation_result['expense_index'], income_signature, expense_signature,
+                  validation_result['similarity_score'],
                   1, validation_result['validation_details'], 'low'))
 
             # 更新球员信息
@@ -445,77 +425,173 @@ class EnhancedTransferService:
             for club_id in [offer['receiving_club_id'], offer['offering_club_id']]:
                 self._create_notification(
                     club_id, 'transfer_completed', '转会完成',
-                    completion_message, None, transfer_id
+                    completion_message, None, transfer_id, conn=conn
                 )
 
+            # 将本次转会按历史记录的形式累加进双方的增量投影状态，水位取写入后的值；
+            # 若随后提交失败，数据库水位与状态不一致，下次验证会重新初始化
+            completed_record = {
+                'transfer_fee': offer['offer_amount'],
+                'agent_commission': income_data.get('agent_commission'),
+                'total_expense': expense_data.get('total_expense')
+            }
+            self.lsh_service.update_club_state(
+                selling_club_id, 'income', self._prepare_lsh_data([completed_record], 'selling')[0],
+                self._club_watermark(selling_club_id, 'selling', conn))
+            self.lsh_service.update_club_state(
+                buying_club_id, 'expense', self._prepare_lsh_data([completed_record], 'buying')[0],
+                self._club_watermark(buying_club_id, 'buying', conn))
+
             conn.commit()
-            conn.close()
+
+            # 新签名加入分段桶表，供近似转会查询
+            if self._lsh_buckets_loaded:
+                self.lsh_service.index_transfer(transfer_id, validation_result['income_index'],
+                                                validation_result['expense_index'])
+
+            # 链上三步确认在后台进行，不等待交易回执；进度和验证交易哈希由回调写回转会记录
+            blockchain_result = None
+            chain_status = None
+            if self.blockchain_service and self.blockchain_service.is_connected():
+                update_status = transfer_status_updater(transfer_id, self.db_path)
+                update_status('pending', {})
+                try:
+                    outcome = self.blockchain_service.submit_transfer_protocol(
+                        selling_club_id, buying_club_id,
+                        int(offer['player_id'].replace('player_', ''), 16) % 1000000,
+                        int(offer['offer_amount']),
+                        validation_result['income_index'],
+                        validation_result['expense_index'],
+                        on_update=update_status
+                    )
+                    blockchain_result, chain_status = self._chain_submission_state(outcome)
+                except Exception as e:
+                    print(f"区块链操作失败: {e}")
+                    update_status('failed', {})
+                    blockchain_result = {'success': False, 'error': str(e)}
+                    chain_status = 'failed'
 
             return {
                 'success': True,
                 'transfer_id': transfer_id,
+                'chain_status': chain_status,
                 'lsh_result': validation_result,
                 'blockchain_result': blockchain_result
             }
 
         except Exception as e:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
             print(f"处理转会交易错误: {e}")
             return {'success': False, 'error': str(e)}
 
-    def _get_club_transfer_history(self, club_id: str, role: str):
-        """获取俱乐部转会历史"""
-        conn = self.get_connection()
-
-        if role == 'selling':
-            column = 'selling_club_id'
-        else:
-            column = 'buying_club_id'
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _chain_submission_state(outcome) -> tuple:
+        """链上流程提交后的 (结果, chain_status)；第一笔交易发送失败时 Future 已完成，直接返回失败"""
+        if not outcome.done():
+            return {'success': True, 'pending': True}, 'pending'
+        result = outcome.result()
+        return result, 'confirmed' if result.get('success') else 'failed'
+
+    def _get_club_transfer_history(self, club_id: str, role: str, conn=None):
+        """获取俱乐部转会历史；传入 conn 时在调用方的事务内读取"""
+        owns_connection = conn is None
+        if owns_connection:
+            conn = self.get_connection()
 
-        history = conn.execute(f"""
-            SELECT transfer_fee, income_data, expense_data 
-            FROM transfers 
-            WHERE {column} = ? AND is_completed = 1
-            ORDER BY created_at DESC LIMIT 10
-        """, (club_id,)).fetchall()
+        history = conn.execute(named_query(f'club_history_{role}'),
+                               (club_id, self.lsh_service.history_window)).fetchall()
 
-        conn.close()
+        if owns_connection:
+            conn.close()
         return history
 
+    @staticmethod
+    def _club_watermark(club_id: str, role: str, conn) -> tuple:
+        """俱乐部已完成转会的 (数量, 最大rowid)"""
+        return tuple(conn.execute(named_query(f'club_history_watermark_{role}'), (club_id,)).fetchone())
+
+    def _ensure_club_lsh_state(self, club_id: str, role: str, conn=None):
+        """若俱乐部尚无增量投影状态或状态水位与数据库不一致，则从最近的转会历史初始化"""
+        data_type = 'income' if role == 'selling' else 'expense'
+        owns_connection = conn is None
+        if owns_connection:
+            conn = self.get_connection()
+        try:
+            watermark = self._club_watermark(club_id, role, conn)
+            if self.lsh_service.club_state_watermark(club_id, data_type) == watermark:
+                return
+
+            history = self._get_club_transfer_history(club_id, role, conn)
+            # 历史按时间倒序返回，状态需按从早到晚的顺序累加
+            records = self._prepare_lsh_data(list(reversed(history)), role)
+            self.lsh_service.load_club_state(club_id, data_type, records, watermark)
+        finally:
+            if owns_connection:
+                conn.close()
+
     def _prepare_lsh_data(self, history: List, role: str):
         """准备LSH验证数据"""
-        data = []
-        for record in history:
-            try:
-                if role == 'selling':
-                    info = json.loads(record['income_data']) if record['income_data'] else {}
-                    data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': info.get('agent_commission', record['transfer_fee'] * 0.05)
-                    })
-                else:
-                    info = json.loads(record['expense_data']) if record['expense_data'] else {}
-                    total_expense = info.get('total_expense', record['transfer_fee'] * 1.1)
-                    data.append({
-                        'transfer_fee': record['transfer_fee'],
-                        'player_market_value': record['transfer_fee'] * 1.1,
-                        'additional_costs': total_expense - record['transfer_fee']
-                    })
-            except:
-                # 如果解析失败，使用默认值
-                data.append({
-                    'transfer_fee': record['transfer_fee'],
-                    'player_market_value': record['transfer_fee'] * 1.1,
-                    'additional_costs': record['transfer_fee'] * 0.05
-                })
-        return data
+        return self.lsh_service.prepare_history_data(history, role)
+
+    def _load_lsh_buckets(self):
+        """首次查询时将已完成转会的签名载入LSH分段桶表"""
+        if self._lsh_buckets_loaded:
+            return
+
+        conn = self.get_connection()
+        rows = conn.execute("""
+            SELECT transfer_id, lsh_income_hash, lsh_expense_hash
+            FROM transfers WHERE is_completed = 1
+        """).fetchall()
+        conn.close()
+
+        for row in rows:
+            self.lsh_service.index_transfer(row['transfer_id'], row['lsh_income_hash'], row['lsh_expense_hash'])
+        self._lsh_buckets_loaded = True
+
+    def find_similar_transfers(self, transfer_id: str, data_type: str = 'income',
+                               min_similarity: float = None):
+        """查找签名与指定转会相近的历史转会"""
+        conn = self.get_connection()
+        transfer = conn.execute("""
+            SELECT lsh_income_hash, lsh_expense_hash FROM transfers WHERE transfer_id = ?
+        """, (transfer_id,)).fetchone()
+        conn.close()
+
+        if not transfer:
+            return []
+
+        self._load_lsh_buckets()
+        index = transfer['lsh_income_hash'] if data_type == 'income' else transfer['lsh_expense_hash']
+        matches = self.lsh_service.find_similar_transfers(index or '', data_type, min_similarity)
+        return [{'transfer_id': match_id, 'similarity_score': similarity}
+                for match_id, similarity in matches if match_id != transfer_id]
+
+    def rescreen_transfers(self, max_workers: int = None, chunk_size: int = 5000):
+        """按当前阈值重新筛查全部历史转会，max_workers 大于1时多进程并行"""
+        return BulkRescreenService(self.db_path, self.lsh_service, chunk_size).rescreen(max_workers)
 
     def _create_notification(self, club_id: str, message_type: str, title: str,
-                             message: str, offer_id: str = None, transfer_id: str = None):
-        """创建通知"""
+                             message: str, offer_id: str = None, transfer_id: str = None, conn=None):
+        """创建通知；传入 conn 时写入调用方的事务，由调用方提交"""
+        if conn is not None:
+            self._insert_notification(conn, club_id, message_type, title, message, offer_id, transfer_id)
+            return
+
         conn = self.get_connection()
-        notification_id = f"notif_{uuid.uuid4().hex[:8]}"
+        self._insert_notification(conn, club_id, message_type, title, message, offer_id, transfer_id)
+        conn.commit()
+        conn.close()
 
+    @staticmethod
+    def _insert_notification(conn, club_id: str, message_type: str, title: str,
+                             message: str, offer_id: str = None, transfer_id: str = None):
+        notification_id = f"notif_{uuid.uuid4().hex[:8]}"
         conn.execute("""
             INSERT INTO notifications 
             (notification_id, club_id, message_type, title, message, 
@@ -524,9 +600,6 @@ class EnhancedTransferService:
         """, (notification_id, club_id, message_type, title, message,
               offer_id, transfer_id))
 
-        conn.commit()
-        conn.close()
-
     def get_club_info(self, club_id: str):
         """获取俱乐部详细信息"""
         conn = self.get_connection()
@@ -563,33 +636,19 @@ class EnhancedTransferService:
             'players': [dict(player) for player in players]
         }
 
-    def get_transfer_market_overview(self):
-        """获取转会市场概览"""
+    def get_transfer_market_overview(self, limit: int = None, offers_cursor: str = None,
+                                     players_cursor: str = None):
+        """获取转会市场概览；报价和可转会球员按页返回，next_cursors 中是下一页游标"""
         conn = self.get_connection()
 
-        # 获取所有待处理报价
-        offers = conn.execute("""
-            SELECT o.*, p.name as player_name, p.position, p.market_value,
-                   oc.name as offering_club_name, rc.name as receiving_club_name
-            FROM transfer_offers o
-            JOIN players p ON o.player_id = p.player_id
-            JOIN clubs oc ON o.offering_club_id = oc.club_id
-            JOIN clubs rc ON o.receiving_club_id = rc.club_id
-            WHERE o.offer_status = 'pending'
-            ORDER BY o.offer_date DESC
-        """).fetchall()
+        # 获取待处理报价
+        offers, next_offers_cursor = fetch_named_page(conn, 'pending_offers', limit, offers_cursor)
 
         # 获取可转会球员
-        transferable_players = conn.execute("""
-            SELECT p.*, c.name as club_name
-            FROM players p
-            JOIN clubs c ON p.current_club_id = c.club_id
-            WHERE p.transfer_status = 1
-            ORDER BY p.market_value DESC
-        """).fetchall()
+        transferable_players, next_players_cursor = fetch_named_page(conn, 'transferable_players', limit, players_cursor)
 
         # 获取最近完成的转会
-        recent_transfers = conn.execute("""
+        recent_transfers = list(iter_rows(conn, """
             SELECT t.*, p.name as player_name,
                    sc.name as selling_club_name, bc.name as buying_club_name
             FROM transfers t
@@ -598,18 +657,22 @@ class EnhancedTransferService:
             JOIN clubs bc ON t.buying_club_id = bc.club_id
             WHERE t.is_completed = 1
             ORDER BY t.completed_at DESC LIMIT 10
-        """).fetchall()
+        """))
 
         conn.close()
 
         return {
-            'pending_offers': [dict(offer) for offer in offers],
-            'transferable_players': [dict(player) for player in transferable_players],
-            'recent_transfers': [dict(transfer) for transfer in recent_transfers]
+            'pending_offers': offers,
+            'transferable_players': transferable_players,
+            'recent_transfers': recent_transfers,
+            'next_cursors': {
+                'pending_offers': next_offers_cursor,
+                'transferable_players': next_players_cursor
+            }
         }
 
-    def get_club_notifications(self, club_id: str, unread_only: bool = True):
-        """获取俱乐部通知"""
+    def iter_club_notifications(self, club_id: str, unread_only: bool = True):
+        """逐条产出俱乐部通知，迭代结束或中途关闭时归还连接"""
         conn = self.get_connection()
 
         query = """
@@ -623,10 +686,14 @@ class EnhancedTransferService:
 
         query += " ORDER BY created_at DESC"
 
-        notifications = conn.execute(query, params).fetchall()
-        conn.close()
+        try:
+            yield from iter_rows(conn, query, params)
+        finally:
+            conn.close()
 
-        return [dict(notification) for notification in notifications]
+    def get_club_notifications(self, club_id: str, unread_only: bool = True):
+        """获取俱乐部通知"""
+        return list(self.iter_club_notifications(club_id, unread_only))
 
     def mark_notification_read(self, notification_id: str):
         """标记通知为已读"""
@@ -1,17 +1,246 @@
 import numpy as np
 import hashlib
 import json
-from datasketch import MinHash, MinHashLSH
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Tuple
 
+from config.database import apply_pragma_profile
+
+
+# 索引方案版本，投影或特征方式变化时递增，使旧的磁盘缓存自动失效
+INDEX_SCHEME_VERSION = 'v3'
+
+# 逐笔对数特征的参考均值与尺度（按转会费约 €2万、对数标准差约1的典型分布取整），
+# 标准化后各特征以0为中心，投影符号由数据决定而不是由共同的偏移量决定
+FEATURE_REFERENCE = {
+    # 转会费、球员身价、转会费/身价
+    'income': (np.array([10.0, 10.0, 0.65]), np.array([1.0, 1.0, 0.25])),
+    # 转会费、附加费用、总成本
+    'expense': (np.array([10.0, 7.8, 10.0]), np.array([1.0, 1.2, 1.0])),
+}
+
+# 0-255每个字节中1的个数，用于NumPy批量popcount
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(value: int) -> int:
+    """计算整数二进制中1的个数"""
+    if hasattr(value, 'bit_count'):  # Python 3.10+
+        return value.bit_count()
+    return bin(value).count('1')
+
+
+class LSHIndexCache:
+    """基于SQLite的LSH索引磁盘缓存，键为(俱乐部ID, 数据类型, 历史数据指纹)
+
+    指纹以索引方案版本开头，并覆盖俱乐部ID、投影种子、位宽和历史记录内容。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        apply_pragma_profile(self._conn)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS lsh_index_cache (
+                club_id TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                lsh_index TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (club_id, data_type, fingerprint)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, club_id: str, data_type: str, fingerprint: str):
+        """查询缓存的索引，未命中返回None"""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT lsh_index FROM lsh_index_cache
+                WHERE club_id = ? AND data_type = ? AND fingerprint = ?
+            """, (club_id, data_type, fingerprint)).fetchone()
+        return row[0] if row else None
+
+    def put(self, club_id: str, data_type: str, fingerprint: str, lsh_index: str):
+        """写入索引"""
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO lsh_index_cache (club_id, data_type, fingerprint, lsh_index)
+                VALUES (?, ?, ?, ?)
+            """, (club_id, data_type, fingerprint, lsh_index))
+            self._conn.commit()
+
+    def put_many(self, entries: List[Tuple[str, str, str, str]]):
+        """批量写入 (俱乐部ID, 数据类型, 指纹, 索引)，整批只提交一次"""
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO lsh_index_cache (club_id, data_type, fingerprint, lsh_index)
+                VALUES (?, ?, ?, ?)
+            """, entries)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LSHBucketIndex:
+    """分段(banding)LSH桶表
+
+    签名被切分为 num_bands 段，任意一段完全相同的签名落入同一个桶成为候选，
+    查询只需检查候选集合而不必扫描全部签名。
+    """
+
+    def __init__(self, bit_length: int, num_bands: int):
+        if bit_length <= 0:
+            raise ValueError("bit_length 必须为正整数")
+        self.bit_length = bit_length
+        self.num_bands = max(1, min(num_bands, bit_length))
+        # 每段在签名整数中的 (右移位数, 掩码)，签名字符串左侧为最高位
+        bounds = [int(bound) for bound in np.linspace(0, bit_length, self.num_bands + 1)]
+        self._bands = [(bit_length - end, (1 << (end - start)) - 1)
+                       for start, end in zip(bounds[:-1], bounds[1:])]
+        self._tables = [defaultdict(set) for _ in self._bands]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_values(self, signature: int):
+        return [(signature >> shift) & mask for shift, mask in self._bands]
+
+    def add(self, key, index: str) -> bool:
+        """加入一个签名；宽度不一致的签名（如旧配置生成的）被忽略"""
+        if not index or len(index) != self.bit_length:
+            return False
+        if key in self._signatures:
+            self.remove(key)
+        signature = LSHService.index_to_int(index)
+        self._signatures[key] = signature
+        for table, value in zip(self._tables, self._band_values(signature)):
+            table[value].add(key)
+        return True
+
+    def remove(self, key):
+        """移除一个签名"""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for table, value in zip(self._tables, self._band_values(signature)):
+            bucket = table.get(value)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[value]
+
+    def candidates(self, index: str) -> set:
+        """返回与给定签名至少有一段相同的候选键"""
+        if len(index) != self.bit_length:
+            return set()
+        result = set()
+        for table, value in zip(self._tables, self._band_values(LSHService.index_to_int(index))):
+            result.update(table.get(value, ()))
+        return result
+
+    def query(self, index: str, min_similarity: float = 0.0) -> List[Tuple[object, float]]:
+        """返回相似度不低于 min_similarity 的候选键及相似度，按相似度降序"""
+        signature = LSHService.index_to_int(index)
+        matches = []
+        for key in self.candidates(index):
+            similarity = LSHService.hamming_similarity(signature, self._signatures[key], self.bit_length)
+            if similarity >= min_similarity:
+                matches.append((key, similarity))
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches
+
+
+class ClubProjectionState:
+    """俱乐部投影累加器
+
+    保存最近 window 笔转会在各超平面上的投影值及其累加和。由于特征编码是逐笔特征的均值，
+    窗口投影的符号等于逐笔投影之和的符号，新增一笔转会只需 O(位宽) 的更新。
+    """
+
+    def __init__(self, index_dimensions: int, window: int, watermark=None):
+        self.window = window
+        self.contributions = deque()
+        self.totals = np.zeros(index_dimensions)
+        self._evictions = 0
+        # 状态对应的数据库水位，由调用方定义和比较（如已完成转会的数量与最大rowid）
+        self.watermark = watermark
+
+    def push(self, contribution: np.ndarray):
+        """加入一笔转会的投影，超出窗口时移除最早的一笔"""
+        self.contributions.append(contribution)
+        self.totals += contribution
+        if len(self.contributions) > self.window:
+            self.totals -= self.contributions.popleft()
+            self._evictions += 1
+            # 定期重新求和，消除浮点累计误差
+            if self._evictions >= self.window:
+                self.totals = np.sum(self.contributions, axis=0)
+                self._evictions = 0
+
+
+# 工作进程内按主进程配置构建的LSH服务
+_WORKER_SERVICE = None
+
+
+def _init_worker(config: Dict):
+    global _WORKER_SERVICE
+    _WORKER_SERVICE = LSHService(**config)
+
+
+def _replay_worker(job: Tuple):
+    data_type, transfer_records, state = job
+    return _WORKER_SERVICE.replay_club_history(transfer_records, data_type, state)
+
 
 class LSHService:
-    def __init__(self, num_perm=128, threshold=0.6):  # 降低阈值到0.6
-        self.num_perm = num_perm
+    # 验证流程中收入/支出索引使用的种子命名空间
+    ROLE_SEED_IDS = {'income': 'seller', 'expense': 'buyer'}
+
+    def __init__(self, threshold=0.6, projection_cache_size=256, seed_key=None,
+                 index_cache_path=None, index_dimensions=None, num_bands=None,
+                 similarity_min=None, similarity_max=None):  # 降低阈值到0.6
+        # 近邻查询的默认相似度阈值
         self.threshold = threshold
-        self.lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        # 合法转会的相似度区间，监管调整阈值后可重新筛查历史转会
+        self.similarity_min = float(similarity_min if similarity_min is not None
+                                    else os.getenv('LSH_SIMILARITY_THRESHOLD_MIN', 0.3))
+        self.similarity_max = float(similarity_max if similarity_max is not None
+                                    else os.getenv('LSH_SIMILARITY_THRESHOLD_MAX', 0.8))
         # 使用固定种子确保结果可重复
         self.random_seed = 42
+        # 索引维度 y（签名位宽），可配置为 64/128/256 等
+        self.index_dimensions = int(index_dimensions or os.getenv('LSH_HASH_DIMENSIONS', 10))
+        # 分段桶表：每段默认4位
+        self.num_bands = int(num_bands or os.getenv('LSH_NUM_BANDS', max(1, self.index_dimensions // 4)))
+        self.income_buckets = LSHBucketIndex(self.index_dimensions, self.num_bands)
+        self.expense_buckets = LSHBucketIndex(self.index_dimensions, self.num_bands)
+        # 俱乐部增量投影状态: (俱乐部ID, 数据类型) -> ClubProjectionState
+        self.history_window = 10
+        self._club_states = {}
+        self._club_states_lock = threading.Lock()
+        # 投影矩阵LRU缓存: (种子, 向量长度, 索引维度) -> 矩阵
+        self.projection_cache_size = projection_cache_size
+        self._projection_cache = OrderedDict()
+        # Web服务线程、回执跟踪和索引线程共用同一个服务，OrderedDict 的读取/移动/淘汰需加锁
+        self._projection_cache_lock = threading.Lock()
+        self.projection_cache_hits = 0
+        self.projection_cache_misses = 0
+        # 种子派生密钥：与进程无关，保证不同进程/重启后索引一致
+        self.seed_key = (seed_key or os.getenv('LSH_SEED_KEY', 'football-transfer-lsh')).encode('utf-8')
+        # 可选的磁盘索引缓存
+        index_cache_path = index_cache_path or os.getenv('LSH_INDEX_CACHE_PATH')
+        self.index_cache = LSHIndexCache(index_cache_path) if index_cache_path else None
 
     def vectorize_transfer_data(self, transfer_data: List[Dict], data_type: str) -> List[float]:
         """将转会数据向量化"""
@@ -37,66 +266,252 @@ class LSHService:
 
         return vector
 
-    def create_income_index(self, club_id: str, transfer_records: List[Dict]) -> str:
-        """创建俱乐部转会收入索引 (对应论文中的步骤1)"""
-        # 构建收入向量 TIVA
-        income_vector = self.vectorize_transfer_data(transfer_records, 'income')
+    # 每笔转会的特征数：3个标准化对数特征 + 3个中心化平方项 + 3个交叉项（不含常数项）
+    FEATURE_DIMENSIONS = 9
+
+    def transfer_features(self, transfer_data: List[Dict], data_type: str) -> np.ndarray:
+        """逐笔转会特征矩阵，形状为 (转会数, FEATURE_DIMENSIONS)"""
+        if not transfer_data:
+            return np.zeros((0, self.FEATURE_DIMENSIONS))
+
+        raw = np.asarray(self.vectorize_transfer_data(transfer_data, data_type), dtype=float).reshape(-1, 3)
+        # 带符号的对数压缩后按固定参考值标准化；参考值与数据无关，窗口特征仍是逐笔特征的均值
+        means, scales = FEATURE_REFERENCE[data_type]
+        z = (np.sign(raw) * np.log1p(np.abs(raw)) - means) / scales
+        return np.hstack([
+            z,
+            z ** 2 - 1.0,
+            z[:, [0, 0, 1]] * z[:, [1, 2, 2]]
+        ])
+
+    @staticmethod
+    def _history_field(record, column: str, json_column: str):
+        """优先读取独立列；旧记录没有该列时才解析JSON字段"""
+        if column in record.keys():
+            return record[column]
+        raw = record[json_column] if json_column in record.keys() else None
+        return json.loads(raw).get(column) if raw else None
+
+    @classmethod
+    def prepare_history_data(cls, history: List, role: str) -> List[Dict]:
+        """把 transfers 表的历史行转换为LSH验证所需的记录"""
+        data = []
+        for record in history:
+            transfer_fee = record['transfer_fee']
+            try:
+                if role == 'selling':
+                    agent_commission = cls._history_field(record, 'agent_commission', 'income_data')
+                    additional_costs = (agent_commission if agent_commission is not None
+                                        else transfer_fee * 0.05)
+                else:
+                    total_expense = cls._history_field(record, 'total_expense', 'expense_data')
+                    additional_costs = (total_expense if total_expense is not None
+                                        else transfer_fee * 1.1) - transfer_fee
+            except (ValueError, TypeError, AttributeError):
+                # 如果解析失败，使用默认值
+                additional_costs = transfer_fee * 0.05
+            data.append({
+                'transfer_fee': transfer_fee,
+                'player_market_value': transfer_fee * 1.1,
+                'additional_costs': additional_costs
+            })
+        return data
+
+    def encode_features(self, transfer_data: List[Dict], data_type: str) -> np.ndarray:
+        """将历史窗口编码为固定长度特征向量
+
+        向量为逐笔特征的均值（一阶矩、二阶矩与交叉矩），长度与历史转会数量无关，
+        因此投影矩阵形状固定，可以预先生成并跨俱乐部批量计算。
+        """
+        features = self.transfer_features(transfer_data, data_type)
+        if not len(features):
+            return np.zeros(self.FEATURE_DIMENSIONS)
+        return features.mean(axis=0)
+
+    def _seed_value(self, club_id: str, data_type: str) -> int:
+        """根据俱乐部ID和数据类型生成投影种子（带密钥的BLAKE2摘要，不受进程哈希随机化影响）"""
+        digest = hashlib.blake2b(f"{club_id}:{data_type}".encode('utf-8'),
+                                 key=self.seed_key, digest_size=4).digest()
+        return int.from_bytes(digest, 'big')
+
+    def _projection_matrix(self, seed_value: int, length: int) -> np.ndarray:
+        """生成 y×length 的随机投影矩阵（RandomState的随机流跨版本稳定）"""
+        return np.random.RandomState(seed_value).uniform(-1, 1, (self.index_dimensions, length))
+
+    def _history_fingerprint(self, seed_value: int, transfer_records: List[Dict], data_type: str,
+                             club_id: str = None) -> str:
+        """计算历史数据指纹，用作磁盘缓存的键（方案版本 + 俱乐部、种子与历史内容的哈希）"""
+        payload = json.dumps({
+            'club': club_id,
+            'seed': seed_value,
+            'dimensions': self.index_dimensions,
+            'data_type': data_type,
+            'records': transfer_records
+        }, sort_keys=True, default=str)
+        return f"{INDEX_SCHEME_VERSION}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _get_projection_matrix(self, seed_value: int, length: int) -> np.ndarray:
+        """从LRU缓存获取投影矩阵，未命中时生成并淘汰最久未使用的矩阵"""
+        key = (seed_value, length, self.index_dimensions)
+        with self._projection_cache_lock:
+            matrix = self._projection_cache.get(key)
+            if matrix is not None:
+                self._projection_cache.move_to_end(key)
+                self.projection_cache_hits += 1
+                return matrix
+            self.projection_cache_misses += 1
+
+        # 矩阵在锁外生成，同一矩阵被并发生成时结果相同，后写入的覆盖先写入的
+        matrix = self._projection_matrix(seed_value, length)
+        matrix.setflags(write=False)  # 缓存的矩阵被共享，禁止修改
+        if self.projection_cache_size > 0:
+            with self._projection_cache_lock:
+                self._projection_cache[key] = matrix
+                self._projection_cache.move_to_end(key)
+                while len(self._projection_cache) > self.projection_cache_size:
+                    self._projection_cache.popitem(last=False)
+        return matrix
+
+    def projection_cache_info(self) -> Dict:
+        """返回投影矩阵缓存的命中统计"""
+        with self._projection_cache_lock:
+            return {
+                'hits': self.projection_cache_hits,
+                'misses': self.projection_cache_misses,
+                'size': len(self._projection_cache),
+                'max_size': self.projection_cache_size
+            }
 
-        # 使用俱乐部ID作为种子确保同一俱乐部的结果一致
-        seed_value = hash(club_id + "income") % (2 ** 32)
-        np.random.seed(seed_value)
+    def clear_projection_cache(self):
+        """清空投影矩阵缓存及统计"""
+        with self._projection_cache_lock:
+            self._projection_cache.clear()
+            self.projection_cache_hits = 0
+            self.projection_cache_misses = 0
 
-        # 重复y次生成索引
-        y = 10  # 索引维度
-        hash_values = []
+    @staticmethod
+    def _bits_to_index(bits: np.ndarray) -> str:
+        """将二值化结果转换为索引字符串"""
+        return ''.join('1' if bit else '0' for bit in bits)
 
-        for i in range(y):
-            # 为每个维度使用不同但确定的种子
-            np.random.seed(seed_value + i)
-            random_vec = np.random.uniform(-1, 1, len(income_vector))
+    def _create_index(self, club_id: str, transfer_records: List[Dict], data_type: str,
+                      seed_id: str = None) -> str:
+        """构建向量并通过一次矩阵乘法得到全部y位索引
 
-            # 计算投影
-            if len(income_vector) > 0:
-                proj = np.dot(income_vector, random_vec)
-            else:
-                proj = 0
+        投影种子默认由俱乐部ID派生；验证流程按角色使用共同的种子（seed_id），磁盘缓存仍按俱乐部区分。
+        """
+        seed_value = self._seed_value(seed_id or club_id, data_type)
 
-            # 二值化
-            hash_values.append(1 if proj >= 0 else 0)
+        fingerprint = None
+        if self.index_cache:
+            fingerprint = self._history_fingerprint(seed_value, transfer_records, data_type, club_id)
+            cached = self.index_cache.get(club_id, data_type, fingerprint)
+            if cached is not None:
+                return cached
 
-        # 生成最终的LSH索引
-        index_string = ''.join(map(str, hash_values))
+        vector = self.encode_features(transfer_records, data_type)
+        projection = self._get_projection_matrix(seed_value, self.FEATURE_DIMENSIONS)
+
+        # 计算投影并二值化
+        index_string = self._bits_to_index(projection @ vector >= 0)
+
+        if self.index_cache:
+            self.index_cache.put(club_id, data_type, fingerprint, index_string)
         return index_string
 
-    def create_expense_index(self, club_id: str, transfer_records: List[Dict]) -> str:
+    def create_income_index(self, club_id: str, transfer_records: List[Dict], seed_id: str = None) -> str:
+        """创建俱乐部转会收入索引 (对应论文中的步骤1)"""
+        # 构建收入向量 TIVA 并生成索引
+        return self._create_index(club_id, transfer_records, 'income', seed_id)
+
+    def create_expense_index(self, club_id: str, transfer_records: List[Dict], seed_id: str = None) -> str:
         """创建俱乐部转会支出索引 (对应论文中的步骤2)"""
-        # 构建支出向量 TEVA
-        expense_vector = self.vectorize_transfer_data(transfer_records, 'expense')
+        # 构建支出向量 TEVA 并生成索引
+        return self._create_index(club_id, transfer_records, 'expense', seed_id)
 
-        # 使用俱乐部ID作为种子确保同一俱乐部的结果一致
-        seed_value = hash(club_id + "expense") % (2 ** 32)
+    def create_indexes_batch(self, club_ids: List[str], transfer_records_list: List[List[Dict]],
+                             data_type: str) -> List[str]:
+        """批量创建多个俱乐部的索引
 
-        # 重复y次生成索引
-        y = 10  # 索引维度
-        hash_values = []
+        特征向量长度固定，共用同一种子的俱乐部只需一次矩阵乘法即可得到全部索引。
+        """
+        if len(club_ids) != len(transfer_records_list):
+            raise ValueError("club_ids 与 transfer_records_list 长度不一致")
+        if not club_ids:
+            return []
 
-        for i in range(y):
-            # 为每个维度使用不同但确定的种子
-            np.random.seed(seed_value + i)
-            random_vec = np.random.uniform(-1, 1, len(expense_vector))
+        results = [None] * len(club_ids)
+        seeds = [self._seed_value(club_id, data_type) for club_id in club_ids]
+        fingerprints = [None] * len(club_ids)
 
-            # 计算投影
-            if len(expense_vector) > 0:
-                proj = np.dot(expense_vector, random_vec)
-            else:
-                proj = 0
+        # 先查询磁盘缓存，只计算未命中的俱乐部
+        pending = list(range(len(club_ids)))
+        if self.index_cache:
+            pending = []
+            for row, (club_id, records) in enumerate(zip(club_ids, transfer_records_list)):
+                fingerprints[row] = self._history_fingerprint(seeds[row], records, data_type, club_id)
+                results[row] = self.index_cache.get(club_id, data_type, fingerprints[row])
+                if results[row] is None:
+                    pending.append(row)
+        if not pending:
+            return results
 
-            # 二值化
-            hash_values.append(1 if proj >= 0 else 0)
+        features = np.vstack([self.encode_features(transfer_records_list[row], data_type) for row in pending])
 
-        # 生成最终的LSH索引
-        index_string = ''.join(map(str, hash_values))
-        return index_string
+        # 按种子分组，每组一次矩阵乘法
+        groups = defaultdict(list)
+        for position, row in enumerate(pending):
+            groups[seeds[row]].append(position)
+
+        bits = np.empty((len(pending), self.index_dimensions), dtype=bool)
+        for seed_value, positions in groups.items():
+            projection = self._get_projection_matrix(seed_value, self.FEATURE_DIMENSIONS)
+            bits[positions] = features[positions] @ projection.T >= 0
+
+        for row, row_bits in zip(pending, bits):
+            results[row] = self._bits_to_index(row_bits)
+        if self.index_cache:
+            self.index_cache.put_many([(club_ids[row], data_type, fingerprints[row], results[row])
+                                       for row in pending])
+        return results
+
+    @staticmethod
+    def index_to_int(index: str) -> int:
+        """将'0'/'1'索引字符串转换为整数签名"""
+        return int(index, 2) if index else 0
+
+    @staticmethod
+    def pack_index(index: str) -> bytes:
+        """将索引字符串打包为紧凑的字节签名（每字节8位，高位在前）"""
+        bits = np.frombuffer(index.encode('ascii'), dtype=np.uint8) - ord('0')
+        return np.packbits(bits).tobytes()
+
+    @staticmethod
+    def unpack_signature(signature: bytes, bit_length: int) -> str:
+        """将字节签名还原为索引字符串"""
+        bits = np.unpackbits(np.frombuffer(signature, dtype=np.uint8))[:bit_length]
+        return LSHService._bits_to_index(bits)
+
+    @staticmethod
+    def hamming_similarity(signature_a: int, signature_b: int, bit_length: int) -> float:
+        """通过 XOR + popcount 计算两个整数签名的汉明相似度"""
+        if bit_length <= 0:
+            return 0.0
+        return 1.0 - _popcount(signature_a ^ signature_b) / bit_length
+
+    @staticmethod
+    def similarity_many(signature: bytes, signatures, bit_length: int) -> np.ndarray:
+        """计算一个字节签名与多个字节签名的汉明相似度
+
+        signatures 可以是等长字节串的列表或形状为 (n, 字节数) 的 uint8 数组。
+        """
+        target = np.frombuffer(signature, dtype=np.uint8)
+        if isinstance(signatures, np.ndarray):
+            matrix = signatures.astype(np.uint8, copy=False).reshape(-1, target.size)
+        else:
+            matrix = np.frombuffer(b''.join(signatures), dtype=np.uint8).reshape(-1, target.size)
+        distances = _POPCOUNT_TABLE[np.bitwise_xor(matrix, target)].sum(axis=1, dtype=np.int64)
+        return 1.0 - distances / bit_length
 
     def detect_money_laundering(self, income_index: str, expense_index: str) -> Tuple[bool, float, str]:
         """洗钱检测判断 (对应论文中的步骤3)"""
@@ -104,17 +519,18 @@ class LSHService:
         if len(income_index) != len(expense_index):
             return False, 0.0, "索引长度不匹配"
 
-        # 计算相似度
-        matching_bits = sum(1 for a, b in zip(income_index, expense_index) if a == b)
-        similarity = matching_bits / len(income_index)
+        # 计算相似度：整数签名 XOR 后统计不同位数
+        similarity = self.hamming_similarity(self.index_to_int(income_index),
+                                             self.index_to_int(expense_index),
+                                             len(income_index))
 
         # 调整判断逻辑：相似度太高或太低都可疑
         # 正常转会应该有中等相似度
-        is_legitimate = 0.3 <= similarity <= 0.8
+        is_legitimate = self.similarity_min <= similarity <= self.similarity_max
 
         details = {
             'similarity_score': similarity,
-            'threshold_range': [0.3, 0.8],
+            'threshold_range': [self.similarity_min, self.similarity_max],
             'income_index': income_index,
             'expense_index': expense_index,
             'is_legitimate': is_legitimate,
@@ -127,22 +543,130 @@ class LSHService:
 
     def _get_reasoning(self, similarity: float) -> str:
         """根据相似度提供判断理由"""
-        if similarity < 0.3:
+        if similarity < self.similarity_min:
             return "相似度过低，可能存在数据操纵"
-        elif similarity > 0.9:
+        elif similarity > self.similarity_max:
             return "相似度过高，可能存在洗钱行为"
         else:
             return "相似度正常，转会合法"
 
-    def validate_transfer(self, selling_club_transfers: List[Dict],
-                          buying_club_transfers: List[Dict]) -> Dict:
-        """完整的转会验证流程"""
-        # 步骤1: 创建卖方收入索引
-        income_index = self.create_income_index("seller", selling_club_transfers)
+    def _buckets(self, data_type: str) -> LSHBucketIndex:
+        return self.income_buckets if data_type == 'income' else self.expense_buckets
 
-        # 步骤2: 创建买方支出索引
-        expense_index = self.create_expense_index("buyer", buying_club_transfers)
+    def index_transfer(self, transfer_id: str, income_index: str, expense_index: str):
+        """将已完成转会的签名加入分段桶表"""
+        self.income_buckets.add(transfer_id, income_index)
+        self.expense_buckets.add(transfer_id, expense_index)
+
+    def find_similar_transfers(self, index: str, data_type: str = 'income',
+                               min_similarity: float = None) -> List[Tuple[str, float]]:
+        """通过分段桶表查找签名相近的历史转会（亚线性查找，不扫描全部记录）"""
+        if min_similarity is None:
+            min_similarity = self.threshold
+        return self._buckets(data_type).query(index, min_similarity)
+
+    def transfer_projections(self, transfer_records: List[Dict], data_type: str) -> np.ndarray:
+        """逐笔转会在验证流程超平面上的投影，形状为 (转会数, 位宽)"""
+        seed_value = self._seed_value(self.ROLE_SEED_IDS[data_type], data_type)
+        projection = self._get_projection_matrix(seed_value, self.FEATURE_DIMENSIONS)
+        return self.transfer_features(transfer_records, data_type) @ projection.T
+
+    def replay_club_history(self, transfer_records: List[Dict], data_type: str,
+                            state: ClubProjectionState = None) -> Tuple[List[str], ClubProjectionState]:
+        """按时间顺序重放单个俱乐部的转会，返回每笔转会（含此前历史窗口）的索引和重放后的状态"""
+        if state is None:
+            state = ClubProjectionState(self.index_dimensions, self.history_window)
+        indexes = []
+        if transfer_records:
+            for contribution in self.transfer_projections(transfer_records, data_type):
+                indexes.append(self._bits_to_index(state.totals + contribution >= 0))
+                state.push(contribution)
+        return indexes, state
+
+    def worker_config(self) -> Dict:
+        """工作进程重建服务所需的配置"""
+        return {
+            'threshold': self.threshold,
+            'projection_cache_size': self.projection_cache_size,
+            'seed_key': self.seed_key.decode('utf-8'),
+            'index_dimensions': self.index_dimensions,
+            'num_bands': self.num_bands,
+            'similarity_min': self.similarity_min,
+            'similarity_max': self.similarity_max
+        }
+
+    def create_process_pool(self, max_workers: int = None) -> ProcessPoolExecutor:
+        """创建并行筛查用的进程池，每个工作进程按当前配置构建自己的LSH服务"""
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                   initargs=(self.worker_config(),))
+
+    def replay_clubs(self, jobs: List[Tuple[str, List[Dict], ClubProjectionState]],
+                     executor: ProcessPoolExecutor = None, workers: int = 1) -> List[Tuple]:
+        """重放多个俱乐部的转会；jobs 为 (数据类型, 转会记录, 初始状态)，结果与 jobs 顺序一致
+
+        并行时每个工作进程约分到4批任务，减少逐个俱乐部序列化和进程间往返的开销。
+        """
+        if executor is None:
+            return [self.replay_club_history(records, data_type, state) for data_type, records, state in jobs]
+        chunksize = max(1, len(jobs) // (max(1, workers) * 4))
+        return list(executor.map(_replay_worker, jobs, chunksize=chunksize))
 
+    def validate_indexes(self, index_pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """批量对 (收入索引, 支出索引) 做洗钱检测，结果与输入顺序一致
+
+        每对只是两次popcount比较，在当前进程内计算比分发到工作进程更快。
+        """
+        return [self._validation_result(income_index, expense_index)
+                for income_index, expense_index in index_pairs]
+
+    def has_club_state(self, club_id: str, data_type: str) -> bool:
+        """俱乐部是否已有增量投影状态"""
+        return (club_id, data_type) in self._club_states
+
+    def club_state_watermark(self, club_id: str, data_type: str):
+        """俱乐部增量投影状态的水位，没有状态时返回 None"""
+        with self._club_states_lock:
+            state = self._club_states.get((club_id, data_type))
+            return state.watermark if state is not None else None
+
+    def load_club_state(self, club_id: str, data_type: str, transfer_records: List[Dict], watermark=None):
+        """由历史记录（按时间从早到晚）初始化俱乐部的增量投影状态"""
+        state = ClubProjectionState(self.index_dimensions, self.history_window, watermark)
+        for contribution in self.transfer_projections(transfer_records[-self.history_window:], data_type):
+            state.push(contribution)
+        with self._club_states_lock:
+            self._club_states[(club_id, data_type)] = state
+
+    def update_club_state(self, club_id: str, data_type: str, transfer_record: Dict, watermark=None):
+        """转会完成后把该笔记录累加进俱乐部状态并记录新的水位；尚未加载的俱乐部下次会从数据库初始化"""
+        with self._club_states_lock:
+            state = self._club_states.get((club_id, data_type))
+            if state is not None:
+                state.push(self.transfer_projections([transfer_record], data_type)[0])
+                state.watermark = watermark
+
+    def reset_club_states(self):
+        """清空所有增量投影状态（例如数据库被其他进程修改后）"""
+        with self._club_states_lock:
+            self._club_states.clear()
+
+    def create_index_incremental(self, club_id: str, data_type: str, current_record: Dict) -> str:
+        """基于俱乐部累加状态与当前转会生成索引，只需 O(位宽) 计算"""
+        totals = self.transfer_projections([current_record], data_type)[0]
+        with self._club_states_lock:
+            state = self._club_states.get((club_id, data_type))
+            if state is not None:
+                totals = totals + state.totals
+        return self._bits_to_index(totals >= 0)
+
+    def validate_transfer_incremental(self, selling_club_id: str, buying_club_id: str,
+                                      current_selling_data: Dict, current_buying_data: Dict) -> Dict:
+        """使用增量投影状态的转会验证，结果与 validate_transfer 对同一历史窗口的结果一致"""
+        income_index = self.create_index_incremental(selling_club_id, 'income', current_selling_data)
+        expense_index = self.create_index_incremental(buying_club_id, 'expense', current_buying_data)
+        return self._validation_result(income_index, expense_index)
+
+    def _validation_result(self, income_index: str, expense_index: str) -> Dict:
         # 步骤3: 洗钱检测
         is_legitimate, similarity, details = self.detect_money_laundering(income_index, expense_index)
 
@@ -152,4 +676,62 @@ class LSHService:
             'is_legitimate': is_legitimate,
             'similarity_score': similarity,
             'validation_details': details
-        }
\ No newline at end of file
+        }
+
+    def validate_transfer(self, selling_club_transfers: List[Dict], buying_club_transfers: List[Dict],
+                          selling_club_id: str = None, buying_club_id: str = None) -> Dict:
+        """完整的转会验证流程；传入俱乐部ID时磁盘缓存按俱乐部区分"""
+        # 步骤1: 创建卖方收入索引
+        income_index = self.create_income_index(selling_club_id or self.ROLE_SEED_IDS['income'],
+                                                selling_club_transfers, self.ROLE_SEED_IDS['income'])
+
+        # 步骤2: 创建买方支出索引
+        expense_index = self.create_expense_index(buying_club_id or self.ROLE_SEED_IDS['expense'],
+                                                  buying_club_transfers, self.ROLE_SEED_IDS['expense'])
+
+        return self._validation_result(income_index, expense_index)
+
+def check_signature_diversity(lsh_service: LSHService = None, samples: int = 1000,
+                              max_collision: float = 0.25, seed: int = 42) -> List[str]:
+    """检查不同的历史窗口能否得到不同的签名，返回未通过的数据类型
+
+    用固定种子生成典型分布的随机历史，计算两段随机历史签名相同的概率（碰撞率）；
+    特征编码退化时几乎所有历史落到同一签名，碰撞率接近1，洗钱检测失去作用。
+    """
+    lsh_service = lsh_service or LSHService()
+    rng = np.random.default_rng(seed)
+    failed = []
+
+    for data_type, seed_id in LSHService.ROLE_SEED_IDS.items():
+        counts = defaultdict(int)
+        for _ in range(samples):
+            fees = rng.lognormal(np.log(20000), 1.0, rng.integers(1, lsh_service.history_window + 1))
+            history = [{'transfer_fee': fee, 'player_market_value': fee * 1.1,
+                        'additional_costs': fee * rng.uniform(0.02, 0.3)} for fee in fees]
+            counts[lsh_service._create_index(seed_id, history, data_type)] += 1
+
+        collision = sum((count / samples) ** 2 for count in counts.values())
+        passed = collision <= max_collision
+        print(f"{'✅' if passed else '❌'} {data_type}: {samples} 段历史得到 {len(counts)} 种签名，"
+              f"碰撞率 {collision:.3f}（上限 {max_collision}）")
+        if not passed:
+            failed.append(data_type)
+    return failed
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='LSH索引自检')
+    parser.add_argument('--check', action='store_true', help='检查不同历史能否得到不同签名')
+    parser.add_argument('--samples', type=int, default=1000, help='随机历史数量')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check_signature_diversity(samples=args.samples) else 0)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+from config.database import DatabaseConfig, get_pool
+
+
+class ReceiptTracker:
+    """在后台线程中跟踪待确认交易的回执
+
+    登记的交易哈希由一个轮询循环统一检查：只有出现新区块时才查询回执，
+    拿到回执或超时后完成对应的 Future，回调交给一个小线程池执行（回调中可以发送下一笔交易），
+    跟踪线程只负责轮询，节点响应慢不会拖延其他交易的回执检查和超时处理。
+    """
+
+    def __init__(self, blockchain_service, poll_interval: float = None, timeout: float = None,
+                 callback_workers: int = None):
+        self.blockchain_service = blockchain_service
+        self.w3 = blockchain_service.w3
+        self.poll_interval = float(poll_interval or os.getenv('RECEIPT_POLL_INTERVAL', 1))
+        self.timeout = float(timeout or os.getenv('RECEIPT_TIMEOUT', 120))
+        self._callbacks = ThreadPoolExecutor(
+            max_workers=int(callback_workers or os.getenv('RECEIPT_CALLBACK_WORKERS', 4)),
+            thread_name_prefix='receipt-callback')
+        # 交易哈希 -> (Future, 回调, 截止时间, 发送账户)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_block = None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def track(self, tx_hash: str, callback: Callable[[Dict], None] = None, sender: str = None) -> Future:
+        """登记待确认的交易，返回在回执到达后完成的 Future，结果格式与 wait_for_transaction 相同
+
+        给出 sender 时，交易超时（可能已被节点丢弃）会让该账户的nonce从节点重新同步。
+        """
+        future = Future()
+        with self._lock:
+            self._pending[tx_hash] = (future, callback, time.time() + self.timeout, sender)
+        # 新登记的交易在下一轮立即检查，不必等到下一个区块
+        self._last_block = None
+        self.start()
+        self._wakeup.set()
+        return future
+
+    def _get_receipt(self, tx_hash: str):
+        """查询回执，尚未上链时返回 None（旧版本返回 None，新版本抛出 TransactionNotFound）"""
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)
+        except Exception:
+            return None
+
+    def _resolve(self, tx_hash: str, result: Dict):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+        if entry is None:
+            return
+        future, callback, _, _ = entry
+        future.set_result(result)
+        if callback is not None:
+            self._callbacks.submit(self._run_callback, callback, result)
+
+    @staticmethod
+    def _run_callback(callback: Callable[[Dict], None], result: Dict):
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"交易回执回调错误: {e}")
+
+    def poll_once(self):
+        """有新区块时检查全部待确认交易的回执，并处理超时的交易"""
+        with self._lock:
+            pending = list(self._pending.items())
+        if not pending:
+            return
+
+        block_number = self.w3.eth.block_number
+        now = time.time()
+        if block_number != self._last_block:
+            self._last_block = block_number
+            for tx_hash, _ in pending:
+                receipt = self._get_receipt(tx_hash)
+                if receipt is not None:
+                    self._resolve(tx_hash, self.blockchain_service.receipt_result(tx_hash, receipt))
+
+        for tx_hash, (_, _, deadline, sender) in pending:
+            if now > deadline:
+                if sender:
+                    self.blockchain_service.nonce_manager.resync(sender)
+                self._resolve(tx_hash, {'success': False, 'tx_hash': tx_hash,
+                                        'error': f'Timed out waiting for receipt after {self.timeout:.0f}s'})
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.pending_count():
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"交易回执轮询错误: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """启动跟踪线程（首次登记交易时自动启动）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='receipt-tracker', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_receipt_tracker(blockchain_service) -> ReceiptTracker:
+    """按节点地址获取共享的回执跟踪器，同一进程内只有一个轮询线程"""
+    key = os.getenv('GANACHE_URL')
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = ReceiptTracker(blockchain_service)
+        return tracker
+
+
+def transfer_status_updater(transfer_id: str, db_path: str = None) -> Callable[[str, Dict], None]:
+    """返回把链上三步流程的进度写入 transfers 表的回调
+
+    chain_status 依次为 pending、proposed、accepted、confirmed，任一步失败为 failed；
+    transaction_hash 记录监管验证交易的哈希。
+    """
+    def update(stage: str, result: Dict):
+        conn = get_pool(db_path or DatabaseConfig.DB_PATH).acquire()
+        try:
+            conn.execute("""
+                UPDATE transfers
+                SET chain_status = ?,
+                    chain_transfer_id = COALESCE(?, chain_transfer_id),
+                    transaction_hash = COALESCE(?, transaction_hash)
+                WHERE transfer_id = ?
+            """, (stage, result.get('transfer_id'),
+                  result.get('tx_hash') if stage == 'confirmed' else None, transfer_id))
+            conn.commit()
+        except Exception as e:
+            print(f"更新链上状态错误: {e}")
+        finally:
+            conn.close()
+
+    return update
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from config.database import get_pool
+from services.lsh_service import LSHService
+
+
+class BulkRescreenService:
+    """批量重新筛查 transfers 表中的全部已完成转会
+
+    按时间顺序分块读取转会（键集分页，不使用 OFFSET），在内存中重放每个俱乐部的历史窗口，
+    每个俱乐部分组的投影用一次矩阵乘法算出，结果用 executemany 写回 lsh_validations。
+    转会表不保存成交时的球员身价，当前转会按历史记录的形式（身价取转会费的1.1倍）参与计算。
+    """
+
+    def __init__(self, db_path='football_transfer_enhanced.db', lsh_service: LSHService = None,
+                 chunk_size=5000):
+        self.db_path = db_path
+        self.lsh_service = lsh_service or LSHService()
+        self.chunk_size = chunk_size
+
+    def get_connection(self):
+        return get_pool(self.db_path).acquire()
+
+    def _fetch_chunk(self, conn, last_created_at, last_rowid) -> List:
+        """读取游标之后的一块已完成转会"""
+        return conn.execute("""
+            SELECT rowid, transfer_id, selling_club_id, buying_club_id, transfer_fee,
+                   agent_commission, total_expense, created_at
+            FROM transfers
+            WHERE is_completed = 1
+              AND (created_at, rowid) > (?, ?)
+            ORDER BY created_at, rowid
+            LIMIT ?
+        """, (last_created_at, last_rowid, self.chunk_size)).fetchall()
+
+    def _screen_chunk(self, rows: List, states: Dict, executor=None, workers: int = 1) -> List[Dict]:
+        """重放一块转会，返回每笔转会的验证结果
+
+        收入索引只依赖卖方俱乐部的历史、支出索引只依赖买方俱乐部的历史，
+        因此按俱乐部分组后各组可以独立（并行）重放。
+        """
+        lsh = self.lsh_service
+        selling_records = lsh.prepare_history_data(rows, 'selling')
+        buying_records = lsh.prepare_history_data(rows, 'buying')
+
+        # (俱乐部ID, 数据类型) -> 该块中属于此俱乐部的行位置
+        positions = defaultdict(list)
+        for position, row in enumerate(rows):
+            positions[(row['selling_club_id'], 'income')].append(position)
+            positions[(row['buying_club_id'], 'expense')].append(position)
+
+        groups = list(positions.items())
+        jobs = []
+        for (club_id, data_type), club_positions in groups:
+            records = selling_records if data_type == 'income' else buying_records
+            jobs.append((data_type, [records[position] for position in club_positions],
+                         states.get((club_id, data_type))))
+
+        income_indexes = [None] * len(rows)
+        expense_indexes = [None] * len(rows)
+        for ((club_id, data_type), club_positions), (indexes, state) in zip(
+                groups, lsh.replay_clubs(jobs, executor, workers)):
+            states[(club_id, data_type)] = state
+            target = income_indexes if data_type == 'income' else expense_indexes
+            for position, lsh_index in zip(club_positions, indexes):
+                target[position] = lsh_index
+
+        results = lsh.validate_indexes(list(zip(income_indexes, expense_indexes)))
+        for row, result in zip(rows, results):
+            result['transfer_id'] = row['transfer_id']
+        return results
+
+    def _write_results(self, conn, results: List[Dict]):
+        """更新已有的验证记录，没有记录的转会插入新记录（批量插入时ID取16位，避免8位ID碰撞）"""
+        transfer_ids = [result['transfer_id'] for result in results]
+        existing = {row['transfer_id'] for row in conn.execute("""
+            SELECT transfer_id FROM lsh_validations
+            WHERE transfer_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(transfer_ids),))}
+
+        updates = []
+        inserts = []
+        for result in results:
+            values = (result['income_index'], result['expense_index'],
+                      self.lsh_service.pack_index(result['income_index']),
+                      self.lsh_service.pack_index(result['expense_index']),
+                      result['similarity_score'], 1 if result['is_legitimate'] else 0,
+                      result['validation_details'], 'low' if result['is_legitimate'] else 'high')
+            if result['transfer_id'] in existing:
+                updates.append(values + (result['transfer_id'],))
+            else:
+                inserts.append((f"validation_{uuid.uuid4().hex[:16]}", result['transfer_id']) + values)
+
+        conn.executemany("""
+            UPDATE lsh_validations
+            SET income_index = ?, expense_index = ?, income_signature = ?, expense_signature = ?,
+                similarity_score = ?, is_legitimate = ?, validation_details = ?, risk_level = ?
+            WHERE transfer_id = ?
+        """, updates)
+        conn.executemany("""
+            INSERT INTO lsh_validations
+            (validation_id, transfer_id, income_index, expense_index, income_signature,
+             expense_signature, similarity_score, is_legitimate, validation_details, risk_level)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+
+    def rescreen(self, max_workers: int = None) -> Dict:
+        """重新筛查全部已完成转会，每块单独提交；max_workers 大于1时使用进程池并行重放"""
+        executor = None
+        try:
+            if max_workers and max_workers > 1:
+                executor = self.lsh_service.create_process_pool(max_workers)
+            conn = self.get_connection()
+            started = time.time()
+            states = {}
+            screened = flagged = 0
+            last_created_at, last_rowid = '', 0
+
+            while True:
+                rows = self._fetch_chunk(conn, last_created_at, last_rowid)
+                if not rows:
+                    break
+                last_created_at, last_rowid = rows[-1]['created_at'], rows[-1]['rowid']
+
+                results = self._screen_chunk(rows, states, executor, max_workers or 1)
+                self._write_results(conn, results)
+                conn.commit()
+
+                screened += len(results)
+                flagged += sum(1 for result in results if not result['is_legitimate'])
+                print(f"已重新筛查 {screened} 笔转会，可疑 {flagged} 笔")
+
+            conn.close()
+            return {
+                'success': True,
+                'screened': screened,
+                'flagged': flagged,
+                'threshold_range': [self.lsh_service.similarity_min, self.lsh_service.similarity_max],
+                'elapsed_seconds': round(time.time() - started, 2)
+            }
+
+        except Exception as e:
+            print(f"批量重新筛查错误: {e}")
+            return {'success': False, 'error': str(e)}
+
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按当前阈值重新筛查全部历史转会')
+    parser.add_argument('--db', default='football_transfer_enhanced.db', help='数据库路径')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='每块读取的转会数')
+    parser.add_argument('--workers', type=int, default=1, help='并行工作进程数')
+    parser.add_argument('--min', type=float, default=None, help='合法相似度下限')
+    parser.add_argument('--max', type=float, default=None, help='合法相似度上限')
+    args = parser.parse_args()
+
+    lsh_service = LSHService(similarity_min=args.min, similarity_max=args.max)
+    result = BulkRescreenService(args.db, lsh_service, args.chunk_size).rescreen(args.workers)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()